@@ -1,9 +1,20 @@
 from asyncio import sleep
+from copy import copy
+from functools import partial
 
-from classes import BaseResource, ResourceKind, Task, Workspace
+from classes import BaseResource, ResourceKind, Task, TaskKind, Workspace
+from daemon import DaemonClient, apply_change
 from data_processors import TasksProcessor, WorkspacesProcessor
 from file_io import FileIO
-from screens import CreateResourceScreen, DeleteResourceScreen, EditResourceScreen
+from rollups import Rollups
+from screens import (
+    BatchEditResourceScreen,
+    CreateResourceScreen,
+    DeleteResourceScreen,
+    EditResourceScreen,
+    StatisticsScreen,
+    TagFilterScreen,
+)
 from textual.app import App, ComposeResult
 from textual.worker import Worker, WorkerState
 from widgets import Header, Overview
@@ -18,6 +29,9 @@ class TaskNomi(App):
 
     def __init__(self, *args, **kwargs):
         self.state = None
+        self.rollups = None
+        # set if the state comes from a running daemon
+        self.daemon_client = None
 
         super().__init__(*args, **kwargs)
 
@@ -32,26 +46,36 @@ class TaskNomi(App):
 
     def _add_resource_to_state(self, resource: BaseResource) -> None:
         if isinstance(resource, Task):
-            self.state.workspaces[self.state.workspace_id].task_dict[resource.id] = resource
+            self.state.workspaces[resource.workspace_id].add_task(resource)
         elif isinstance(resource, Workspace):
             self.state.workspaces[resource.id] = resource
 
     def _remove_resource_from_state(self, resource_id: str, resource_kind: ResourceKind) -> None:
         if resource_kind == ResourceKind.TASK:
-            workspace_id = self.state.workspace_id
-            current_workspace = self.state.workspaces[workspace_id]
-            current_workspace.task_dict.pop(resource_id, None)
+            task = self._get_resource_from_state(resource_kind, resource_id)
+            self.state.workspaces[task.workspace_id].remove_task(resource_id)
         elif resource_kind == ResourceKind.WORKSPACE:
             self.state.workspaces.pop(resource_id, None)
 
     def _get_resource_from_state(self, resource_kind: ResourceKind, resource_id: str) -> BaseResource:
         if resource_kind == ResourceKind.TASK:
-            resource = self.state.workspaces[self.state.workspace_id].task_dict[resource_id]
+            # the task is usually in the current workspace, unless the tasks of all workspaces are shown
+            current_workspace = self.state.workspaces[self.state.workspace_id]
+            resource = current_workspace.task_dict.get(resource_id) or next(
+                workspace.task_dict[resource_id]
+                for workspace in self.state.workspaces.values()
+                if resource_id in workspace.task_dict
+            )
         else:
             resource = self.state.workspaces[resource_id]
 
         return resource
 
+    def _refresh_content(self, highlighted_row: int) -> None:
+        overview = self.query_one(Overview)
+        overview.set_content(highlighted_row=highlighted_row)
+        self.query_one(Header).set_info_content()
+
     def on_worker_state_changed(self, event: Worker.StateChanged) -> None:
         """Called when the worker state changes."""
 
@@ -61,6 +85,28 @@ class TaskNomi(App):
             header = self.query_one(Header)
             header.set_info_content()
 
+            if FileIO.quarantined_paths:
+                self.notify(
+                    f'{len(FileIO.quarantined_paths)} damaged file(s) were moved to {FileIO.QUARANTINE_DIR_NAME}, '
+                    'run "python cli.py fsck" to check the data.',
+                    severity='warning',
+                )
+
+            # resume reclaiming workspaces whose deletion got interrupted
+            if FileIO.has_trash():
+                self._start_trash_reclamation()
+
+            completed_tasks = [
+                task
+                for workspace in self.state.workspaces.values()
+                for task in workspace.task_dict.values()
+                if task.kind == TaskKind.COMPLETED and not task.archived
+            ]
+            if completed_tasks:
+                self.run_worker(
+                    partial(FileIO.archive_tasks, completed_tasks), name='_archive_tasks', group='archive', thread=True
+                )
+
     def on_resize(self, _) -> None:
         # don't set content if app just started
         if self.state:
@@ -75,8 +121,17 @@ class TaskNomi(App):
         kwargs_dict = message.kwargs_dict
         kwargs_dict['id'] = message.resource_id
         kwargs_dict['creation_datetime'] = resource_to_edit.get_creation_time_as_str()
-
-        self._process_resource_created_edited(kwargs_dict, message.resource_kind)
+        if isinstance(resource_to_edit, Task):
+            # the task modal has no kind input, so the kind must not get reset by an edit
+            kwargs_dict['kind'] = resource_to_edit.kind
+            kwargs_dict['workspace_id'] = resource_to_edit.workspace_id
+            kwargs_dict['completion_datetime'] = resource_to_edit.to_dict()['completion_datetime']
+            kwargs_dict['depends_on'] = resource_to_edit.depends_on
+        elif isinstance(resource_to_edit, Workspace):
+            kwargs_dict['task_dict'] = resource_to_edit.task_dict
+            kwargs_dict['summary'] = resource_to_edit.summary
+
+        self._process_resource_created_edited(kwargs_dict, message.resource_kind, resource_to_edit)
 
     def on_overview_open_create_modal(self, message: Overview.OpenCreateModal) -> None:
         self.app.push_screen(CreateResourceScreen(resource_kind=message.resource_kind))
@@ -86,42 +141,287 @@ class TaskNomi(App):
 
         self.app.push_screen(EditResourceScreen(resource=resource))
 
+    def on_overview_resource_kind_toggled(self, _: Overview.ResourceKindToggled) -> None:
+        if self.state.resource_kind == ResourceKind.TASK:
+            self.state.resource_kind = ResourceKind.WORKSPACE
+        else:
+            self.state.resource_kind = ResourceKind.TASK
+
+        FileIO.write_config(self.state)
+        self.query_one(Overview).clear_selection()
+        self._refresh_content(highlighted_row=0)
+
+    def on_overview_task_kind_cycled(self, _: Overview.TaskKindCycled) -> None:
+        task_kinds = list(TaskKind)
+        self.state.task_kind = task_kinds[(task_kinds.index(self.state.task_kind) + 1) % len(task_kinds)]
+        self._load_archive_if_needed()
+
+        FileIO.write_config(self.state)
+        self.query_one(Overview).clear_selection()
+        self._refresh_content(highlighted_row=0)
+
+    def on_overview_all_workspaces_toggled(self, _: Overview.AllWorkspacesToggled) -> None:
+        self.state.all_workspaces = not self.state.all_workspaces
+        if self.state.all_workspaces:
+            self.state.load_all_workspaces()
+        else:
+            self.state.enforce_resident_limit()
+        self._load_archive_if_needed()
+
+        FileIO.write_config(self.state)
+        self.query_one(Overview).clear_selection()
+        self._refresh_content(highlighted_row=0)
+
+    def _load_archive_if_needed(self) -> None:
+        if self.state.all_workspaces:
+            workspaces = self.state.workspaces.values()
+        else:
+            workspaces = [self.state.workspaces[self.state.workspace_id]]
+
+        for workspace in workspaces:
+            if self.state.task_kind == TaskKind.COMPLETED and not workspace.archive_loaded:
+                FileIO.load_archived_tasks(workspace)
+
+    def on_overview_open_statistics(self, _: Overview.OpenStatistics) -> None:
+        self.app.push_screen(
+            StatisticsScreen(self.rollups, self.state.workspaces, self.state.workspace_id, self.state.all_workspaces)
+        )
+
+    def on_overview_open_tag_filter_modal(self, _: Overview.OpenTagFilterModal) -> None:
+        self.app.push_screen(TagFilterScreen(self.state.tag_filter))
+
+    def on_tag_filter_screen_tag_filter_set(self, message: TagFilterScreen.TagFilterSet) -> None:
+        self.state.tag_filter = message.tag_filter
+
+        FileIO.write_config(self.state)
+        self.query_one(Overview).clear_selection()
+        self._refresh_content(highlighted_row=0)
+
+    def on_overview_dependencies_toggled(self, message: Overview.DependenciesToggled) -> None:
+        task = self._get_resource_from_state(ResourceKind.TASK, message.task_id)
+        workspace = self.state.workspaces[task.workspace_id]
+
+        if any(dependency_id not in workspace.task_dict for dependency_id in message.dependency_ids):
+            self.notify('Tasks can only depend on tasks of the same workspace!', severity='error')
+            return
+
+        if all(dependency_id in task.depends_on for dependency_id in message.dependency_ids):
+            task.depends_on = [
+                dependency_id for dependency_id in task.depends_on if dependency_id not in message.dependency_ids
+            ]
+        elif workspace.would_create_cycle(task.id, message.dependency_ids):
+            self.notify('The dependencies would create a cycle!', severity='error')
+            return
+        else:
+            task.depends_on = task.depends_on + [
+                dependency_id for dependency_id in message.dependency_ids if dependency_id not in task.depends_on
+            ]
+
+        # updates the blocked state of the task
+        workspace.add_task(task)
+        FileIO.write_resource(task)
+        self._publish_change(tasks=[task])
+
+        overview = self.query_one(Overview)
+        overview.clear_selection()
+        self._refresh_content(highlighted_row=overview.cursor_row)
+
+    def on_overview_hide_blocked_toggled(self, _: Overview.HideBlockedToggled) -> None:
+        self.state.hide_blocked = not self.state.hide_blocked
+
+        FileIO.write_config(self.state)
+        self.query_one(Overview).clear_selection()
+        self._refresh_content(highlighted_row=0)
+
+    def on_overview_workspace_selected(self, message: Overview.WorkspaceSelected) -> None:
+        self.state.workspace_id = message.workspace_id
+        self.state.resource_kind = ResourceKind.TASK
+        self._load_archive_if_needed()
+
+        FileIO.write_config(self.state)
+        self.query_one(Overview).clear_selection()
+        self._refresh_content(highlighted_row=0)
+
     def on_overview_open_delete_modal(self, message: Overview.OpenDeleteModal) -> None:
+        if message.resource_kind == ResourceKind.WORKSPACE and len(message.resource_ids) >= len(self.state.workspaces):
+            self.notify('The last workspace can not be deleted!', severity='error')
+            return
+
         self.app.push_screen(
             DeleteResourceScreen(
-                resource_id=message.resource_id,
+                resource_ids=message.resource_ids,
                 resource_name=message.resource_name,
                 resource_kind=message.resource_kind,
             )
         )
 
+    def on_overview_open_batch_edit_modal(self, message: Overview.OpenBatchEditModal) -> None:
+        workspace_names = [workspace.name for workspace in self.state.workspaces.values()]
+
+        self.app.push_screen(
+            BatchEditResourceScreen(resource_ids=message.resource_ids, workspace_names=workspace_names)
+        )
+
     def on_delete_resource_screen_delete_resource(self, message: DeleteResourceScreen.DeleteResource) -> None:
-        self._remove_resource_from_state(message.resource_id, message.resource_kind)
-        FileIO.delete_resource(message.resource_id, message.resource_kind)
+        resources = [
+            self._get_resource_from_state(message.resource_kind, resource_id) for resource_id in message.resource_ids
+        ]
+
+        for resource_id in message.resource_ids:
+            self._remove_resource_from_state(resource_id, message.resource_kind)
+        FileIO.delete_resources(resources)
+
+        if message.resource_kind == ResourceKind.TASK:
+            self.rollups.update(resources, [])
+            self._publish_change(deleted_task_ids=message.resource_ids)
+        elif message.resource_kind == ResourceKind.WORKSPACE:
+            for resource in resources:
+                self.rollups.remove_workspace(resource.id)
+            self._publish_change(deleted_workspace_ids=message.resource_ids)
+
+        if message.resource_kind == ResourceKind.WORKSPACE:
+            if self.state.workspace_id not in self.state.workspaces:
+                self.state.workspace_id = next(iter(self.state.workspaces))
+                FileIO.write_config(self.state)
+
+            self._start_trash_reclamation()
 
         overview = self.query_one(Overview)
-        overview.set_content(highlighted_row=max(0, overview.cursor_row - 1))
-        self.query_one(Header).set_info_content()
+        overview.clear_selection()
+        self._refresh_content(highlighted_row=max(0, overview.cursor_row - len(resources)))
+
+    def on_batch_edit_resource_screen_resources_edited(self, message: BatchEditResourceScreen.ResourcesEdited) -> None:
+        kwargs_dict = message.kwargs_dict
+        tasks = [self._get_resource_from_state(ResourceKind.TASK, resource_id) for resource_id in message.resource_ids]
+        previous_tasks = [copy(task) for task in tasks]
+        previous_workspace_ids = dict()
+        # the next occurrences of completed recurring tasks
+        next_tasks = []
+
+        target_workspace_id = None
+        if 'workspace_name' in kwargs_dict:
+            target_workspace_id = next(
+                workspace.id
+                for workspace in self.state.workspaces.values()
+                if workspace.name == kwargs_dict['workspace_name']
+            )
+
+        # apply all changes to the state first, so that everything is persisted and rendered only once
+        for task, previous_task in zip(tasks, previous_tasks):
+            if 'priority' in kwargs_dict:
+                task.priority = kwargs_dict['priority']
+            if 'kind' in kwargs_dict:
+                task.set_kind(TaskKind[kwargs_dict['kind'].upper()])
+            if target_workspace_id and target_workspace_id != task.workspace_id:
+                previous_workspace_ids[task.id] = task.workspace_id
+                self.state.workspaces[task.workspace_id].remove_task(task.id)
+                task.workspace_id = target_workspace_id
+                # dependencies only exist within a workspace
+                task.depends_on = []
+
+            # only completing the task creates the next occurrence, not other edits of a completed task
+            if task.kind == TaskKind.COMPLETED and previous_task.kind != TaskKind.COMPLETED and task.recurrence:
+                next_tasks.append(TasksProcessor.create_next_occurrence(task))
+
+            # also makes sure the task counts of the workspace rows get updated
+            self.state.get_workspace(task.workspace_id).add_task(task)
+
+        for next_task in next_tasks:
+            self.state.get_workspace(next_task.workspace_id).add_task(next_task)
+
+        FileIO.write_resources(tasks + next_tasks, previous_workspace_ids)
+        self.rollups.update(previous_tasks, tasks + next_tasks)
+        self._publish_change(tasks=tasks + next_tasks)
+        # the target workspace only had to be loaded for the move
+        self.state.enforce_resident_limit()
+
+        overview = self.query_one(Overview)
+        overview.clear_selection()
+        self._refresh_content(highlighted_row=overview.cursor_row)
+
+    def on_unmount(self) -> None:
+        if self.state:
+            resident_workspaces = [workspace for workspace in self.state.workspaces.values() if workspace.resident]
+            FileIO.write_workspace_summaries(resident_workspaces)
+
+        if self.daemon_client:
+            self.daemon_client.close()
+
+    def _start_trash_reclamation(self) -> None:
+        # removing thousands of task files takes a while, so it is done in a thread, outside the event loop
+        self.run_worker(FileIO.reclaim_trash, name='_reclaim_trash', group='trash', thread=True)
 
     async def _load_data(self) -> None:
-        self.state = FileIO.load_data()
+        self.daemon_client = DaemonClient.connect()
+
+        if self.daemon_client:
+            self.state = self.daemon_client.load_app_state()
+            self.run_worker(self._listen_to_daemon, name='_listen_to_daemon', group='daemon', thread=True)
+        else:
+            self.state = FileIO.load_data()
+        self._load_archive_if_needed()
+
+        # quarantined tasks are still counted in the rollups
+        if FileIO.quarantined_paths:
+            quarantine_path = FileIO._get_app_path() / FileIO.QUARANTINE_DIR_NAME
+            Rollups.invalidate(
+                Rollups.get_workspace_ids(path.relative_to(quarantine_path) for path in FileIO.quarantined_paths)
+            )
+        self.rollups = Rollups.load()
 
         # add minor delay, so that table gets mounted once and therefore the screen sice is set.
         await sleep(0.1)
 
-    def _process_resource_created_edited(self, kwargs_dict: dict, resource_kind: ResourceKind):
+    def _process_resource_created_edited(
+        self, kwargs_dict: dict, resource_kind: ResourceKind, previous_resource: BaseResource = None
+    ):
         data_processor = self._get_data_processor(resource_kind)
 
         if resource_kind == ResourceKind.TASK:
-            kwargs_dict['workspace_id'] = self.state.workspace_id
+            kwargs_dict.setdefault('workspace_id', self.state.workspace_id)
 
         resource = data_processor.create(**kwargs_dict)
         FileIO.write_resource(resource)
         self._add_resource_to_state(resource)
 
-        overview = self.query_one(Overview)
-        overview.set_content(highlighted_row=overview.cursor_row)
-        self.query_one(Header).set_info_content()
+        if resource_kind == ResourceKind.TASK:
+            self.rollups.update([previous_resource] if previous_resource else [], [resource])
+            self._publish_change(tasks=[resource])
+        elif resource_kind == ResourceKind.WORKSPACE:
+            self._publish_change(workspaces=[resource])
+
+        self._refresh_content(highlighted_row=self.query_one(Overview).cursor_row)
+
+    def _publish_change(self, **kwargs) -> None:
+        # the files are already written, the daemon and the other apps only update their state
+        if not self.daemon_client:
+            return
+
+        try:
+            self.daemon_client.publish_change(**kwargs)
+        except (OSError, RuntimeError):
+            self.daemon_client.close()
+            self.daemon_client = None
+            self.notify('Lost the connection to the daemon, other apps will not see the changes.', severity='warning')
+
+    def _listen_to_daemon(self) -> None:
+        for event in self.daemon_client.iter_events():
+            self.call_from_thread(self._apply_daemon_event, event)
+
+    def _apply_daemon_event(self, event: dict) -> None:
+        if not self.daemon_client:
+            return
+
+        if event['event'] == 'reload':
+            # the data directory was changed without the app, e.g. by a sync
+            self.state = self.daemon_client.load_app_state()
+        else:
+            apply_change(self.state, event['change'])
+        self._load_archive_if_needed()
+
+        # the other app already updated the rollups file
+        self.rollups = Rollups.load()
+        self._refresh_content(highlighted_row=self.query_one(Overview).cursor_row)
 
     @staticmethod
     def _get_data_processor(resource_kind: ResourceKind):
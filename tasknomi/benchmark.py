@@ -0,0 +1,97 @@
+import json
+import sys
+import tempfile
+from os import environ
+from time import perf_counter
+
+import file_io
+from classes import Task, Workspace
+from file_io import FileIO
+
+# compares the old indented task files with the compact codec, run with: python benchmark.py [number of tasks]
+
+
+def _write_legacy(tasks: list[Task]) -> None:
+    for task in tasks:
+        with open(FileIO._get_app_path() / task.workspace_id / f'{task.id}.json', 'w') as f:
+            json.dump(task.to_dict(), f, indent=4)
+
+
+def _load_legacy(workspace: Workspace) -> None:
+    for task_file_path in (FileIO._get_app_path() / workspace.id).iterdir():
+        with open(task_file_path, 'r') as f:
+            FileIO._task_from_dict(json.load(f))
+
+
+def _write_codec(tasks: list[Task]) -> None:
+    for task in tasks:
+        FileIO._write_task_to_file(task)
+
+
+def _load_codec(workspace: Workspace) -> None:
+    for task_file_path in (FileIO._get_app_path() / workspace.id).iterdir():
+        with open(task_file_path, 'rb') as f:
+            FileIO._task_from_dict(FileIO._decode(f.read()))
+
+
+def _codec_legacy(task_dicts: list[dict]) -> None:
+    for task_dict in task_dicts:
+        json.loads(json.dumps(task_dict, indent=4))
+
+
+def _codec(task_dicts: list[dict]) -> None:
+    for task_dict in task_dicts:
+        FileIO._decode(FileIO._encode(task_dict))
+
+
+def _measure(function, *args, repeat: int = 3) -> float:
+    # best of a few runs, file system timings are noisy
+    times = []
+
+    for _ in range(repeat):
+        start = perf_counter()
+        function(*args)
+        times.append(perf_counter() - start)
+
+    return min(times)
+
+
+def main(number_tasks: int) -> None:
+    fast_codec = file_io.orjson
+    variants = [
+        ('indented json', _write_legacy, _load_legacy, _codec_legacy, None),
+        ('compact json', _write_codec, _load_codec, _codec, None),
+    ]
+    if fast_codec:
+        variants.append(('compact orjson', _write_codec, _load_codec, _codec, fast_codec))
+
+    print(f'{number_tasks} tasks')
+
+    for name, write, load, encode_decode, codec in variants:
+        file_io.orjson = codec
+
+        with tempfile.TemporaryDirectory() as home:
+            environ['HOME'] = home
+            FileIO._get_app_path().mkdir()
+            workspace = Workspace('benchmark')
+            (FileIO._get_app_path() / workspace.id).mkdir()
+            tasks = [
+                Task(name=f'task {i}', workspace_id=workspace.id, priority=i % 5, description='some text ' * 5)
+                for i in range(number_tasks)
+            ]
+
+            write_time = _measure(write, tasks)
+            load_time = _measure(load, workspace)
+            codec_time = _measure(encode_decode, [task.to_dict() for task in tasks])
+            size = sum(path.stat().st_size for path in (FileIO._get_app_path() / workspace.id).iterdir())
+
+        print(
+            f'{name:<16} write {write_time * 1000:7.1f} ms   load {load_time * 1000:7.1f} ms   '
+            f'encode+decode {codec_time * 1000:6.1f} ms   {size / 1024:7.1f} KiB'
+        )
+
+    file_io.orjson = fast_codec
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
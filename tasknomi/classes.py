@@ -1,16 +1,45 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from datetime import datetime
+from bisect import bisect_left, insort
+from calendar import monthrange
+from collections import OrderedDict, defaultdict
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
 from enum import IntEnum
-from uuid import uuid4
+from functools import cached_property
+from operator import attrgetter
 
-from services import humanize_date
+from services import (
+    encode_id_time,
+    generate_id,
+    get_id_time_prefix,
+    get_next_humanize_change,
+    humanize_date,
+    is_time_sortable_id,
+)
 
 
 @dataclass
 class Row:
     key: str
     values: tuple
+    # column index -> datetime for humanized cells, needed to update them when the day changes
+    dates: dict[int, datetime] = field(default_factory=dict)
+    widths: tuple[int, ...] = field(init=False)
+
+    def __post_init__(self):
+        # computed once per row, so cached rows don't need to be measured again for every render
+        self.widths = tuple(len(str(value)) for value in self.values)
+
+    @cached_property
+    def next_date_change(self) -> datetime | None:
+        # the next moment at which one of the humanized cells changes. Rows of resources are only cached for the day
+        # they were created on, so it is computed at most once per row and day, and only for rows that are displayed.
+        now = datetime.now()
+
+        return min(
+            (get_next_humanize_change(date_time, now) for date_time in self.dates.values() if date_time), default=None
+        )
 
 
 @dataclass
@@ -18,6 +47,8 @@ class TableData:
     rows: list[Row]
     column_names: list[str]
     title: str
+    # rows that were not created yet, if the number of rows was limited
+    remaining_rows: Iterator[Row] | None = None
 
 
 class TaskKind(IntEnum):
@@ -29,6 +60,29 @@ class TaskKind(IntEnum):
         return f'{self.name.replace('_', '-')}'
 
 
+class Granularity(IntEnum):
+    DAY = 1
+    WEEK = 2
+    MONTH = 3
+
+    def __str__(self):
+        return self.name
+
+    def shift(self, date_time: datetime, number: int) -> datetime:
+        # months that are too short for the day get their last day
+        if self == Granularity.DAY:
+            return date_time + timedelta(days=number)
+        elif self == Granularity.WEEK:
+            return date_time + timedelta(weeks=number)
+
+        year, month_index = divmod(date_time.month - 1 + number, 12)
+        year += date_time.year
+
+        return date_time.replace(
+            year=year, month=month_index + 1, day=min(date_time.day, monthrange(year, month_index + 1)[1])
+        )
+
+
 class ResourceKind(IntEnum):
     TASK = 1
     WORKSPACE = 2
@@ -40,9 +94,34 @@ class ResourceKind(IntEnum):
 class BaseResource(ABC):
     _DATE_TIME_FORMAT = '%Y/%m/%d-%H:%M:%S'
     _DATE_FORMAT = '%Y/%m/%d'
+    # public fields that are not rendered, they are also set from worker threads
+    _UNRENDERED_FIELDS = frozenset()
+
+    def __setattr__(self, name, value):
+        # a changed public field can change how the resource is rendered, so the cached row gets dropped
+        if not name.startswith('_') and name not in self._UNRENDERED_FIELDS:
+            self.__dict__['_row'] = None
+
+        super().__setattr__(name, value)
 
-    @abstractmethod
     def to_row(self) -> Row:
+        # humanized dates depend on the current day, so rows are only cached for the day they were created on
+        today = date.today()
+        row = self.__dict__.get('_row')
+
+        # the local row is returned, another thread might drop the cached one in the meantime
+        if row is None or self._row_date != today:
+            row = self._create_row()
+            self._row = row
+            self._row_date = today
+
+        return row
+
+    def invalidate_row(self) -> None:
+        self._row = None
+
+    @abstractmethod
+    def _create_row(self) -> Row:
         pass
 
     @abstractmethod
@@ -60,10 +139,23 @@ class BaseResource(ABC):
         return date_time.strftime(cls._DATE_FORMAT)
 
     def get_creation_time_as_str(self):
-        return self.creation_datetime.strftime(self._DATE_TIME_FORMAT)
+        return self._creation_datetime_str or self.creation_datetime.strftime(self._DATE_TIME_FORMAT)
+
+    def _set_creation_datetime(self, creation_datetime: str, now: datetime) -> None:
+        # stored resources are only parsed once the datetime is needed, e.g. to render their row
+        self._creation_datetime = None if creation_datetime else now
+        self._creation_datetime_str = creation_datetime
+
+    def _get_creation_datetime(self) -> datetime:
+        if self._creation_datetime is None:
+            self._creation_datetime = datetime.strptime(self._creation_datetime_str, self._DATE_TIME_FORMAT)
+
+        return self._creation_datetime
 
 
 class Task(BaseResource):
+    _UNRENDERED_FIELDS = frozenset({'archived'})
+
     def __init__(
         self,
         name: str,
@@ -74,17 +166,32 @@ class Task(BaseResource):
         due_datetime: str = '',
         creation_datetime: str = '',
         id: str = '',
+        completion_datetime: str = '',
+        tags: list[str] = None,
+        depends_on: list[str] = None,
+        recurrence: int = 0,
     ):
         self.name = name
         self.description = description
         self.priority = priority
         self.kind = kind
         self.workspace_id = workspace_id
-
+        self.tags = sorted(set(tags)) if tags else []
+        # ids of tasks of the same workspace that need to be completed first
+        self.depends_on = list(depends_on) if depends_on else []
+        # only the next occurrence of a recurring task is stored, the following ones are computed when needed
+        self.recurrence = Granularity(recurrence) if recurrence else None
+        # set by the DependencyGraph of the workspace, the task is blocked while it is not 0
+        self.number_open_dependencies = 0
+        # set by FileIO for completed tasks that are stored in an archive segment instead of their own file
+        self.archived = False
+
+        now = datetime.now()
         if id:
             self.id = id
         else:
-            self.id = str(uuid4())
+            self.id = generate_id(now)
+        self._sort_key = None
         if due_datetime:
             if len(due_datetime) == 10:
                 due_datetime = f'{due_datetime}-23:59:59'
@@ -92,27 +199,66 @@ class Task(BaseResource):
             self.due_datetime = datetime.strptime(due_datetime, self._DATE_TIME_FORMAT)
         else:
             self.due_datetime = ''
-        if creation_datetime:
-            self._creation_datetime = datetime.strptime(creation_datetime, self._DATE_TIME_FORMAT)
+        self._set_creation_datetime(creation_datetime, now)
+        # only known for tasks that were completed after it was introduced
+        if completion_datetime:
+            self.completion_datetime = datetime.strptime(completion_datetime, self._DATE_TIME_FORMAT)
         else:
-            self._creation_datetime = datetime.now()
+            self.completion_datetime = ''
 
     @property
     def creation_datetime(self):
-        return self._creation_datetime
+        return self._get_creation_datetime()
 
-    def to_row(self) -> Row:
+    def set_kind(self, kind: TaskKind) -> None:
+        if kind != self.kind:
+            self.completion_datetime = datetime.now() if kind == TaskKind.COMPLETED else ''
+
+        self.kind = kind
+
+    @property
+    def sort_key(self) -> tuple:
+        # tasks are ordered by creation, the id makes the key unique. The time part of the id is used, so the date
+        # does not have to be parsed, only the uuid4 ids of older tasks need their creation time.
+        if self._sort_key is None:
+            if is_time_sortable_id(self.id):
+                self._sort_key = get_id_time_prefix(self.id), self.id
+            else:
+                self._sort_key = encode_id_time(self.creation_datetime), self.id
+
+        return self._sort_key
+
+    def _create_row(self) -> Row:
         return Row(
             self.id,
-            (self.name, self.priority, humanize_date(self.due_datetime), humanize_date(self.creation_datetime)),
+            (
+                self.name,
+                self.priority,
+                self._get_due_label(),
+                humanize_date(self.creation_datetime),
+                ' '.join(self.tags),
+                self.number_open_dependencies or '',
+            ),
+            {2: self.due_datetime, 3: self.creation_datetime} if self.due_datetime else {3: self.creation_datetime},
         )
 
+    def _get_due_label(self) -> str:
+        if self.recurrence:
+            return f'{humanize_date(self.due_datetime)}, every {str(self.recurrence).lower()}'.removeprefix(', ')
+
+        return humanize_date(self.due_datetime)
+
     def to_dict(self) -> dict:
         if self.due_datetime:
             # noinspection PyUnresolvedReferences
             due_datetime = self.due_datetime.strftime(self._DATE_TIME_FORMAT)
         else:
             due_datetime = ''
+        if self.completion_datetime:
+            # noinspection PyUnresolvedReferences
+            completion_datetime = self.completion_datetime.strftime(self._DATE_TIME_FORMAT)
+        else:
+            completion_datetime = ''
 
         as_dict = {
             'name': self.name,
@@ -120,46 +266,302 @@ class Task(BaseResource):
             'priority': self.priority,
             'kind': self.kind,
             'description': self.description,
-            'creation_datetime': self.creation_datetime.strftime(self._DATE_TIME_FORMAT),
+            'creation_datetime': self.get_creation_time_as_str(),
             'due_datetime': due_datetime,
+            'completion_datetime': completion_datetime,
+            'tags': self.tags,
+            'depends_on': self.depends_on,
+            'recurrence': self.recurrence or 0,
             'workspace_id': self.workspace_id,
         }
 
         return as_dict
 
 
+class TagIndex:
+    # every task gets a position, the tasks of each tag and kind are stored as the set bits of an int. Tag queries are
+    # answered with bitwise operations on these ints instead of looking at every task.
+    def __init__(self, tasks: Iterable[Task] = ()):
+        self._task_ids: list[str | None] = []
+        self._positions: dict[str, int] = dict()
+        self._free_positions: list[int] = []
+        self._tag_bitmaps: dict[str, int] = defaultdict(int)
+        self._kind_bitmaps: dict[TaskKind, int] = defaultdict(int)
+        # task id -> (kind, tags) as they were indexed, needed to clear the bits again
+        self._indexed_dict: dict[str, tuple[TaskKind, tuple[str, ...]]] = dict()
+
+        for task in tasks:
+            self.add(task)
+
+    def add(self, task: Task) -> None:
+        self.remove(task.id)
+
+        if self._free_positions:
+            position = self._free_positions.pop()
+            self._task_ids[position] = task.id
+        else:
+            position = len(self._task_ids)
+            self._task_ids.append(task.id)
+
+        bit = 1 << position
+        self._positions[task.id] = position
+        self._indexed_dict[task.id] = (task.kind, tuple(task.tags))
+        self._kind_bitmaps[task.kind] |= bit
+        for tag in task.tags:
+            self._tag_bitmaps[tag] |= bit
+
+    def remove(self, task_id: str) -> None:
+        position = self._positions.pop(task_id, None)
+
+        if position is None:
+            return
+
+        bit = 1 << position
+        kind, tags = self._indexed_dict.pop(task_id)
+        self._kind_bitmaps[kind] &= ~bit
+        for tag in tags:
+            self._tag_bitmaps[tag] &= ~bit
+            if not self._tag_bitmaps[tag]:
+                del self._tag_bitmaps[tag]
+
+        self._task_ids[position] = None
+        self._free_positions.append(position)
+
+    def query(self, included_tags: Iterable[str], excluded_tags: Iterable[str], kind: TaskKind = None) -> list[str]:
+        # ids of the tasks of the kind that have all included and none of the excluded tags
+        if kind is None:
+            bitmap = 0
+            for kind_bitmap in self._kind_bitmaps.values():
+                bitmap |= kind_bitmap
+        else:
+            bitmap = self._kind_bitmaps.get(kind, 0)
+
+        for tag in included_tags:
+            bitmap &= self._tag_bitmaps.get(tag, 0)
+        for tag in excluded_tags:
+            bitmap &= ~self._tag_bitmaps.get(tag, 0)
+
+        # the binary string is searched instead of shifting the int, which would copy it for every task
+        bits = bin(bitmap)[:1:-1]
+        task_ids = []
+        position = bits.find('1')
+
+        while position != -1:
+            task_ids.append(self._task_ids[position])
+            position = bits.find('1', position + 1)
+
+        return task_ids
+
+
+class DependencyGraph:
+    # keeps the number of open dependencies of every task up to date. Only the tasks that depend on a changed task
+    # are touched, they are found with the reverse edges. Tasks that are completed or not in the workspace anymore
+    # don't block.
+    def __init__(self, tasks: Iterable[Task] = ()):
+        self._task_dict: dict[str, Task] = dict()
+        # task id -> ids of the tasks that depend on it
+        self._dependents: dict[str, set[str]] = defaultdict(set)
+        # task id -> (completed, dependency ids) as they were added, an edited task can be the same object
+        self._indexed_dict: dict[str, tuple[bool, tuple[str, ...]]] = dict()
+
+        for task in tasks:
+            self.add(task)
+
+    def add(self, task: Task) -> None:
+        was_open = self._is_open(task.id)
+        self._remove_edges(task.id)
+
+        dependency_ids = tuple(task.depends_on)
+        self._task_dict[task.id] = task
+        self._indexed_dict[task.id] = (task.kind == TaskKind.COMPLETED, dependency_ids)
+        for dependency_id in dependency_ids:
+            self._dependents[dependency_id].add(task.id)
+
+        number_open_dependencies = sum(1 for dependency_id in dependency_ids if self._is_open(dependency_id))
+        if task.number_open_dependencies != number_open_dependencies:
+            task.number_open_dependencies = number_open_dependencies
+
+        self._propagate(task.id, was_open)
+
+    def remove(self, task_id: str) -> None:
+        was_open = self._is_open(task_id)
+        self._remove_edges(task_id)
+        self._indexed_dict.pop(task_id, None)
+        self._task_dict.pop(task_id, None)
+
+        self._propagate(task_id, was_open)
+
+    def would_create_cycle(self, task_id: str, dependency_ids: Iterable[str]) -> bool:
+        # a cycle exists if the task can be reached from one of its new dependencies
+        visited = set()
+        stack = list(dependency_ids)
+
+        while stack:
+            current_id = stack.pop()
+
+            if current_id == task_id:
+                return True
+            elif current_id in visited or current_id not in self._indexed_dict:
+                continue
+
+            visited.add(current_id)
+            stack.extend(self._indexed_dict[current_id][1])
+
+        return False
+
+    def _is_open(self, task_id: str) -> bool:
+        return task_id in self._indexed_dict and not self._indexed_dict[task_id][0]
+
+    def _remove_edges(self, task_id: str) -> None:
+        if task_id in self._indexed_dict:
+            for dependency_id in self._indexed_dict[task_id][1]:
+                self._dependents[dependency_id].discard(task_id)
+
+    def _propagate(self, task_id: str, was_open: bool) -> None:
+        # blocked is not transitive: a dependent only needs to know whether its dependency is open
+        is_open = self._is_open(task_id)
+
+        if was_open == is_open:
+            return
+
+        for dependent_id in self._dependents.get(task_id, ()):
+            self._task_dict[dependent_id].number_open_dependencies += 1 if is_open else -1
+
+
 class Workspace(BaseResource):
-    def __init__(self, name: str, task_dict: dict[str, Task] = None, id: str = '', creation_datetime: str = ''):
+    def __init__(
+        self,
+        name: str,
+        task_dict: dict[str, Task] = None,
+        id: str = '',
+        creation_datetime: str = '',
+        summary: dict = None,
+    ):
+        now = datetime.now()
         self.name = name
         if id:
             self.id = id
         else:
-            self.id = str(uuid4())
+            self.id = generate_id(now)
         if task_dict:
             self.task_dict = task_dict
         else:
             self.task_dict = dict()
-
-        if creation_datetime:
-            self._creation_datetime = datetime.strptime(creation_datetime, self._DATE_TIME_FORMAT)
-        else:
-            self._creation_datetime = datetime.now()
+        # archived tasks are loaded lazily, when the completed tasks of the workspace are displayed for the first time
+        self.archive_loaded = False
+        # sort keys of all tasks in order, built on first use and then kept up to date by add_task and remove_task
+        self._ordered_keys = None
+        # built on the first tag query, also kept up to date by add_task and remove_task
+        self._tag_index = None
+        self._dependency_graph = DependencyGraph(self.task_dict.values())
+        # workspaces that were evicted by AppState only keep a summary of their tasks instead of the tasks
+        self.resident = summary is None
+        self.summary = summary
+
+        self._set_creation_datetime(creation_datetime, now)
 
     @property
     def creation_datetime(self):
-        return self._creation_datetime
+        return self._get_creation_datetime()
+
+    def add_task(self, task: Task) -> None:
+        previous_task = self.task_dict.get(task.id)
+        self.task_dict[task.id] = task
+        # the row contains the task counts
+        self.invalidate_row()
+
+        if self._ordered_keys is not None and (previous_task is None or previous_task.sort_key != task.sort_key):
+            if previous_task:
+                self._remove_ordered_key(previous_task.sort_key)
+            insort(self._ordered_keys, task.sort_key)
+        if self._tag_index is not None:
+            self._tag_index.add(task)
+        self._dependency_graph.add(task)
+
+    def remove_task(self, task_id: str) -> Task | None:
+        self.invalidate_row()
+        task = self.task_dict.pop(task_id, None)
+
+        if task and self._ordered_keys is not None:
+            self._remove_ordered_key(task.sort_key)
+        if task and self._tag_index is not None:
+            self._tag_index.remove(task_id)
+        if task:
+            self._dependency_graph.remove(task_id)
+
+        return task
+
+    def load_tasks(self, task_dict: dict[str, Task]) -> None:
+        self.task_dict = task_dict
+        self._ordered_keys = None
+        self._tag_index = None
+        self._dependency_graph = DependencyGraph(task_dict.values())
+        self.summary = None
+        self.resident = True
+
+    def get_summary(self) -> dict:
+        if not self.resident:
+            return self.summary
+
+        current_tasks = [task for task in self.task_dict.values() if task.kind == TaskKind.CURRENT]
+
+        return {
+            'number_current': len(current_tasks),
+            'number_backlog': sum(1 for task in self.task_dict.values() if task.kind == TaskKind.BACKLOG),
+            'current_due_dates': sorted(
+                self.get_date_as_str(task.due_datetime) for task in current_tasks if task.due_datetime
+            ),
+        }
+
+    def evict(self) -> None:
+        self.summary = self.get_summary()
+        self.task_dict = dict()
+        self._ordered_keys = None
+        self._tag_index = None
+        self._dependency_graph = DependencyGraph()
+        self.archive_loaded = False
+        self.resident = False
+
+    def iter_ordered_tasks(self):
+        if self._ordered_keys is None:
+            self._ordered_keys = sorted(task.sort_key for task in self.task_dict.values())
+
+        # the id is always the last element of the key
+        return (self.task_dict[key[-1]] for key in self._ordered_keys)
+
+    def would_create_cycle(self, task_id: str, dependency_ids: Iterable[str]) -> bool:
+        return self._dependency_graph.would_create_cycle(task_id, dependency_ids)
+
+    def get_tagged_tasks(
+        self, included_tags: Iterable[str], excluded_tags: Iterable[str], kind: TaskKind = None
+    ) -> list[Task]:
+        if self._tag_index is None:
+            self._tag_index = TagIndex(self.task_dict.values())
+
+        tasks = [self.task_dict[task_id] for task_id in self._tag_index.query(included_tags, excluded_tags, kind)]
+
+        return sorted(tasks, key=attrgetter('sort_key'))
+
+    def _remove_ordered_key(self, key: tuple) -> None:
+        index = bisect_left(self._ordered_keys, key)
+
+        if index < len(self._ordered_keys) and self._ordered_keys[index] == key:
+            del self._ordered_keys[index]
+
+    def _create_row(self) -> Row:
+        summary = self.get_summary()
 
-    def to_row(self) -> Row:
         return Row(
             self.id,
-            (self.name, len(self.task_dict.keys()), len(self.task_dict.keys()), humanize_date(self.creation_datetime)),
+            (self.name, summary['number_current'], summary['number_backlog'], humanize_date(self.creation_datetime)),
+            {3: self.creation_datetime},
         )
 
     def to_dict(self) -> dict:
         as_dict = {
             'name': self.name,
             'id': self.id,
-            'creation_datetime': self.creation_datetime.strftime(self._DATE_TIME_FORMAT),
+            'creation_datetime': self.get_creation_time_as_str(),
         }
 
         return as_dict
@@ -172,8 +574,83 @@ class AppState:
         workspace_id: str,
         resource_kind: ResourceKind = ResourceKind.TASK,
         task_kind: TaskKind = TaskKind.CURRENT,
+        all_workspaces: bool = False,
+        tag_filter: str = '',
+        hide_blocked: bool = False,
+        max_resident_workspaces: int = 0,
+        resident_workspace_ids: list[str] = None,
+        workspace_loader: Callable[[Workspace], None] = None,
+        workspace_evicter: Callable[[Workspace], None] = None,
     ):
         self.workspaces = workspaces
-        self.workspace_id = workspace_id
         self.resource_kind = resource_kind
         self.task_kind = task_kind
+        # show the tasks of all workspaces instead of only the selected one
+        self.all_workspaces = all_workspaces
+        # e.g. 'work urgent !waiting', only tasks with all tags and without the ones starting with ! are shown
+        self.tag_filter = tag_filter
+        # hide current tasks that have dependencies that are not completed yet
+        self.hide_blocked = hide_blocked
+
+        # only the tasks of the last used workspaces are kept in memory, 0 means no limit. The loader reads the tasks
+        # of a workspace that is not resident anymore, the evicter is called after a workspace got evicted.
+        self.max_resident_workspaces = max_resident_workspaces
+        self._workspace_loader = workspace_loader
+        self._workspace_evicter = workspace_evicter
+        # least recently used first
+        self._resident_workspace_ids = OrderedDict.fromkeys(
+            workspace_id for workspace_id in resident_workspace_ids or [] if workspace_id in workspaces
+        )
+
+        self.workspace_id = workspace_id
+        if all_workspaces:
+            self.load_all_workspaces()
+
+    @property
+    def workspace_id(self) -> str:
+        return self._workspace_id
+
+    @workspace_id.setter
+    def workspace_id(self, workspace_id: str) -> None:
+        self._workspace_id = workspace_id
+        self._resident_workspace_ids[workspace_id] = None
+        self._resident_workspace_ids.move_to_end(workspace_id)
+
+        self.get_workspace(workspace_id)
+        self.enforce_resident_limit()
+
+    @property
+    def resident_workspace_ids(self) -> list[str]:
+        return list(self._resident_workspace_ids)
+
+    def get_workspace(self, workspace_id: str) -> Workspace:
+        # the workspace is loaded if needed, but it is only kept if it is one of the last used ones
+        workspace = self.workspaces[workspace_id]
+
+        if not workspace.resident and self._workspace_loader:
+            self._workspace_loader(workspace)
+
+        return workspace
+
+    def load_all_workspaces(self) -> None:
+        for workspace_id in self.workspaces:
+            self.get_workspace(workspace_id)
+
+    def enforce_resident_limit(self) -> None:
+        for workspace_id in list(self._resident_workspace_ids):
+            if workspace_id not in self.workspaces:
+                del self._resident_workspace_ids[workspace_id]
+
+        # all tasks are needed while all workspaces are shown
+        if not self.max_resident_workspaces or self.all_workspaces:
+            return
+
+        while len(self._resident_workspace_ids) > self.max_resident_workspaces:
+            self._resident_workspace_ids.popitem(last=False)
+
+        for workspace in self.workspaces.values():
+            if workspace.resident and workspace.id not in self._resident_workspace_ids:
+                workspace.evict()
+
+                if self._workspace_evicter:
+                    self._workspace_evicter(workspace)
@@ -0,0 +1,143 @@
+from argparse import ArgumentParser
+from pathlib import Path
+
+from file_io import FileIO
+
+# entry point of TaskNomi, without a command the TUI is started. Textual is only imported for the TUI, so the other
+# commands stay fast.
+
+
+def run_app(_) -> None:
+    from app import TaskNomi
+
+    app = TaskNomi()
+    app.run(mouse=False)
+
+
+def _reload_daemon() -> None:
+    # a running daemon has to read the changed data directory again
+    from daemon import DaemonClient
+
+    client = DaemonClient.connect()
+    if client:
+        client.request('reload')
+        client.close()
+
+
+def run_sync(args) -> None:
+    from sync import sync
+
+    result = sync(FileIO._get_app_path(), Path(args.directory).expanduser(), args.rescan)
+
+    for title, relative_paths in (
+        ('copied from other directory', result.copied_to_source),
+        ('copied to other directory', result.copied_to_target),
+        ('deleted', result.deleted),
+        ('merged', result.merged),
+    ):
+        print(f'{title}: {len(relative_paths)}')
+        for relative_path in relative_paths:
+            print(f'  {relative_path}')
+
+    if result.copied_to_source or result.deleted or result.merged:
+        _reload_daemon()
+
+
+def run_query(args) -> None:
+    from query import get_query_args, run_query
+
+    # the daemon module and its imports are only loaded if a daemon might be running
+    if not (FileIO._get_app_path() / FileIO.DAEMON_SOCKET_FILE_NAME).exists():
+        print(run_query(args))
+        return
+
+    from daemon import DaemonClient
+
+    client = DaemonClient.connect()
+    if not client:
+        print(run_query(args))
+        return
+
+    try:
+        print(client.request('query', args=get_query_args(args))['output'])
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    finally:
+        client.close()
+
+
+def run_fsck(args) -> None:
+    from fsck import check_data_directory, format_problems, repair
+
+    problems = check_data_directory(args.jobs)
+    if args.repair:
+        repair(problems)
+        if problems:
+            _reload_daemon()
+
+    print(format_problems(problems, repaired=args.repair))
+
+    if problems and not args.repair:
+        raise SystemExit(1)
+
+
+def run_daemon(_) -> None:
+    from daemon import serve
+
+    serve()
+
+
+def get_parser() -> ArgumentParser:
+    parser = ArgumentParser(prog='python cli.py')
+    parser.set_defaults(function=run_app)
+    subparsers = parser.add_subparsers(title='commands')
+
+    sync_parser = subparsers.add_parser(
+        'sync', help='sync the data directory with another one, e.g. in a shared folder. Close the app before.'
+    )
+    sync_parser.add_argument('directory', help='the other TaskNomi data directory')
+    sync_parser.add_argument(
+        '--rescan', action='store_true', help='also look for files that were changed without the app, e.g. by hand'
+    )
+    sync_parser.set_defaults(function=run_sync)
+
+    query_parser = subparsers.add_parser('query', help='print tasks or task counts without starting the app')
+    query_parser.add_argument('--counts', action='store_true', help='print the task counts of the header')
+    query_parser.add_argument('--kind', choices=['current', 'completed', 'backlog'], help='defaults to the app view')
+    query_parser.add_argument('--tags', help='tag filter like "work !waiting", defaults to the app view')
+    workspace_group = query_parser.add_mutually_exclusive_group()
+    workspace_group.add_argument('--workspace', help='workspace name, defaults to the workspace selected in the app')
+    workspace_group.add_argument('--all-workspaces', action='store_true')
+    query_parser.add_argument(
+        '--upcoming', type=int, metavar='DAYS', help='print the occurrences of recurring tasks in the next days'
+    )
+    query_parser.add_argument('--json', action='store_true', help='print json instead of plain text')
+    query_parser.set_defaults(function=run_query)
+
+    fsck_parser = subparsers.add_parser(
+        'fsck', help='check the data directory for damaged files. Close the app before.'
+    )
+    fsck_parser.add_argument(
+        '--repair',
+        action='store_true',
+        help=f'move damaged files into {FileIO.QUARANTINE_DIR_NAME} and create missing workspace directories',
+    )
+    fsck_parser.add_argument('--jobs', type=int, help='number of worker processes, defaults to the number of cpus')
+    fsck_parser.set_defaults(function=run_fsck)
+
+    daemon_parser = subparsers.add_parser(
+        'daemon',
+        help='keep the data loaded for faster starts of the app and the query command, apps share their changes live',
+    )
+    daemon_parser.set_defaults(function=run_daemon)
+
+    return parser
+
+
+def main() -> None:
+    args = get_parser().parse_args()
+    args.function(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+import json
+import signal
+import socket
+import socketserver
+import sys
+from argparse import Namespace
+from collections.abc import Iterator
+from pathlib import Path
+from threading import Lock
+from uuid import uuid4
+
+from classes import AppState, Task, TaskKind, Workspace
+from file_io import FileIO
+
+# an optional process that keeps the whole state loaded and serves it over a unix socket. Apps and the headless
+# commands get the state from it instead of reading the data directory, and apps send the changes they made, which
+# are pushed to all other connected apps. Requests, responses and events are json objects, one per line.
+
+
+def get_socket_path() -> Path:
+    return FileIO._get_app_path() / FileIO.DAEMON_SOCKET_FILE_NAME
+
+
+def apply_change(app_state: AppState, change_dict: dict) -> None:
+    # the files were already written by the app that made the change, only the state in memory is updated
+    for workspace_dict in change_dict.get('workspaces', []):
+        workspace = app_state.workspaces.get(workspace_dict['id'])
+
+        if workspace:
+            workspace.name = workspace_dict['name']
+        else:
+            app_state.workspaces[workspace_dict['id']] = Workspace(
+                name=workspace_dict['name'],
+                id=workspace_dict['id'],
+                creation_datetime=workspace_dict['creation_datetime'],
+            )
+
+    for task_id in change_dict.get('deleted_task_ids', []):
+        _remove_task(app_state, task_id)
+
+    for task_dict in change_dict.get('tasks', []):
+        task = FileIO._task_from_dict(task_dict)
+        # the task might have been moved to another workspace
+        _remove_task(app_state, task.id)
+
+        # the summaries of evicted workspaces get corrected when they are loaded again
+        workspace = app_state.workspaces.get(task.workspace_id)
+        if workspace and workspace.resident:
+            workspace.add_task(task)
+
+    for workspace_id in change_dict.get('deleted_workspace_ids', []):
+        app_state.workspaces.pop(workspace_id, None)
+
+    if app_state.workspace_id not in app_state.workspaces:
+        app_state.workspace_id = next(iter(app_state.workspaces))
+
+
+def _remove_task(app_state: AppState, task_id: str) -> None:
+    for workspace in app_state.workspaces.values():
+        if workspace.remove_task(task_id):
+            return
+
+
+class StateDaemon(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path):
+        self.app_state = self._load_app_state()
+        # the handlers run in their own threads
+        self.lock = Lock()
+        # client id -> connection that receives the events
+        self.subscribers: dict[str, socket.socket] = dict()
+
+        super().__init__(str(socket_path), DaemonRequestHandler)
+
+    def broadcast(self, event: dict, origin_client_id: str = '') -> None:
+        line = f'{json.dumps(event)}\n'.encode()
+
+        for client_id, connection in list(self.subscribers.items()):
+            if client_id == origin_client_id:
+                continue
+
+            try:
+                connection.sendall(line)
+            except OSError:
+                self.subscribers.pop(client_id, None)
+
+    def reload(self) -> None:
+        self.app_state = self._load_app_state()
+
+    @staticmethod
+    def _load_app_state() -> AppState:
+        # the daemon keeps all workspaces, the limit only applies to the apps
+        app_state = FileIO.load_data()
+        app_state.max_resident_workspaces = 0
+        app_state.load_all_workspaces()
+
+        return app_state
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    server: StateDaemon
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            request = json.loads(line)
+
+            try:
+                response = self._handle_request(request)
+            except (Exception, SystemExit) as e:
+                response = {'ok': False, 'error': str(e)}
+
+            self.wfile.write(f'{json.dumps(response)}\n'.encode())
+
+            # the connection is only used for events from now on
+            if request['op'] == 'subscribe':
+                self.server.subscribers[request['client_id']] = self.request
+
+        for client_id, connection in list(self.server.subscribers.items()):
+            if connection is self.request:
+                self.server.subscribers.pop(client_id, None)
+
+    def _handle_request(self, request: dict) -> dict:
+        op = request['op']
+        server = self.server
+
+        if op in ('ping', 'subscribe'):
+            return {'ok': True}
+
+        with server.lock:
+            if op == 'load':
+                return {'ok': True, 'workspaces': self._get_workspace_dicts(request['resident_workspace_ids'])}
+            elif op == 'load_workspace':
+                workspace = server.app_state.workspaces[request['workspace_id']]
+                return {'ok': True, 'tasks': [task.to_dict() for task in workspace.task_dict.values()]}
+            elif op == 'query':
+                return {'ok': True, 'output': self._run_query(request['args'])}
+            elif op == 'change':
+                apply_change(server.app_state, request['change'])
+                server.broadcast({'event': 'change', 'change': request['change']}, request['client_id'])
+                return {'ok': True}
+            elif op == 'reload':
+                server.reload()
+                server.broadcast({'event': 'reload'})
+                return {'ok': True}
+
+        raise ValueError(f'unknown op {op}')
+
+    def _get_workspace_dicts(self, resident_workspace_ids: list[str] | None) -> list[dict]:
+        workspace_dicts = []
+
+        for workspace in self.server.app_state.workspaces.values():
+            workspace_dict = workspace.to_dict()
+
+            if resident_workspace_ids is None or workspace.id in resident_workspace_ids:
+                workspace_dict['tasks'] = [task.to_dict() for task in workspace.task_dict.values()]
+            else:
+                workspace_dict['summary'] = workspace.get_summary()
+
+            workspace_dicts.append(workspace_dict)
+
+        return workspace_dicts
+
+    def _run_query(self, args_dict: dict) -> str:
+        from query import get_output
+
+        # the defaults of the query are the current view of the apps, the state of the daemon is not changed for it
+        config_dict = FileIO.read_config()
+        view_dict = {
+            'workspace_id': config_dict['workspace_id'],
+            'task_kind': TaskKind(config_dict['task_kind']),
+            'tag_filter': config_dict.get('tag_filter', ''),
+            'hide_blocked': config_dict.get('hide_blocked', False),
+        }
+
+        return get_output(Namespace(**args_dict), self.server.app_state, view_dict)
+
+
+class DaemonClient:
+    TIMEOUT_SECONDS = 10
+
+    def __init__(self, connection: socket.socket, client_id: str = ''):
+        self.connection = connection
+        self.client_id = client_id or str(uuid4())
+        self._file = connection.makefile('rwb')
+        self._event_client = None
+
+    @classmethod
+    def connect(cls, client_id: str = '') -> 'DaemonClient | None':
+        # None if no daemon is running
+        socket_path = get_socket_path()
+
+        if not socket_path.exists():
+            return None
+
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(cls.TIMEOUT_SECONDS)
+
+        try:
+            connection.connect(str(socket_path))
+        except OSError:
+            connection.close()
+            return None
+
+        return cls(connection, client_id)
+
+    def request(self, op: str, **kwargs) -> dict:
+        self._file.write(f'{json.dumps({'op': op} | kwargs)}\n'.encode())
+        self._file.flush()
+        line = self._file.readline()
+
+        if not line:
+            raise ConnectionError('The daemon closed the connection!')
+
+        response = json.loads(line)
+        if not response['ok']:
+            raise RuntimeError(response['error'])
+
+        return response
+
+    def load_app_state(self) -> AppState:
+        config_dict = FileIO.read_config()
+        response = self.request('load', resident_workspace_ids=FileIO.get_resident_workspace_ids(config_dict))
+        workspaces = dict()
+
+        for workspace_dict in response['workspaces']:
+            workspace = Workspace(
+                name=workspace_dict['name'],
+                id=workspace_dict['id'],
+                creation_datetime=workspace_dict['creation_datetime'],
+                summary=workspace_dict.get('summary'),
+            )
+            if workspace.resident:
+                workspace.load_tasks(self._get_task_dict(workspace_dict['tasks']))
+
+            workspaces[workspace.id] = workspace
+
+        return FileIO.create_app_state(config_dict, workspaces, self.load_workspace_tasks)
+
+    def load_workspace_tasks(self, workspace: Workspace) -> None:
+        workspace.load_tasks(self._get_task_dict(self.request('load_workspace', workspace_id=workspace.id)['tasks']))
+
+    def publish_change(
+        self,
+        tasks: list[Task] = (),
+        deleted_task_ids: list[str] = (),
+        workspaces: list[Workspace] = (),
+        deleted_workspace_ids: list[str] = (),
+    ) -> None:
+        change_dict = {
+            'tasks': [task.to_dict() for task in tasks],
+            'deleted_task_ids': list(deleted_task_ids),
+            'workspaces': [workspace.to_dict() for workspace in workspaces],
+            'deleted_workspace_ids': list(deleted_workspace_ids),
+        }
+
+        self.request('change', client_id=self.client_id, change=change_dict)
+
+    def iter_events(self) -> Iterator[dict]:
+        # blocks until the next event, ends when the connection gets closed
+        self._event_client = self.connect(self.client_id)
+
+        if self._event_client is None:
+            return
+
+        self._event_client.request('subscribe', client_id=self.client_id)
+        self._event_client.connection.settimeout(None)
+
+        try:
+            for line in self._event_client._file:
+                yield json.loads(line)
+        except (OSError, ValueError):
+            return
+
+    def close(self) -> None:
+        for client in (self, self._event_client):
+            if client:
+                # shutdown also wakes up a thread that waits for events
+                try:
+                    client.connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                client.connection.close()
+
+    @staticmethod
+    def _get_task_dict(task_dicts: list[dict]) -> dict[str, Task]:
+        return {task_dict['id']: FileIO._task_from_dict(task_dict) for task_dict in task_dicts}
+
+
+def serve() -> None:
+    socket_path = get_socket_path()
+
+    running_client = DaemonClient.connect()
+    if running_client:
+        running_client.close()
+        raise SystemExit('The daemon is already running!')
+
+    # left behind by a daemon that did not shut down properly
+    socket_path.unlink(missing_ok=True)
+
+    # a stopped daemon removes its socket, so the apps read the data directory again
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit())
+
+    with StateDaemon(socket_path) as server:
+        print(f'Listening on {socket_path}')
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            socket_path.unlink(missing_ok=True)
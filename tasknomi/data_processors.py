@@ -1,23 +1,44 @@
+import heapq
 from abc import ABC, abstractmethod
+from collections.abc import Iterable
+from datetime import date, datetime, time
+from itertools import chain, islice
+from operator import attrgetter
 
-from classes import BaseResource, TableData, Task, TaskKind, Workspace
+from classes import BaseResource, Granularity, TableData, Task, TaskKind, Workspace
+from services import parse_tag_filter, parse_tags
 
 
 class DataProcessor(ABC):
     @classmethod
-    def get_table_data(cls, workspaces: dict[str, Workspace], filter_dict: dict) -> TableData:
+    def get_table_data(cls, workspaces: dict[str, Workspace], filter_dict: dict, limit: int = None) -> TableData:
         column_names = cls._get_column_names()
 
         resources = cls._get_resources(workspaces, filter_dict)
         resources = cls._apply_filters(resources, filter_dict)
-        rows = [resource.to_row() for resource in resources]
-        title = cls._get_table_title(resources, filter_dict)
 
-        return TableData(rows, column_names, title)
+        if limit is None:
+            rows = [resource.to_row() for resource in resources]
+            return TableData(rows, column_names, cls.get_table_title(str(len(rows)), filter_dict))
+
+        # only the first rows get created, the rest is created on demand from remaining_rows
+        remaining_rows = (resource.to_row() for resource in resources)
+        rows = list(islice(remaining_rows, limit + 1))
+
+        if len(rows) <= limit:
+            return TableData(rows, column_names, cls.get_table_title(str(len(rows)), filter_dict))
+
+        remaining_rows = chain([rows.pop()], remaining_rows)
+
+        return TableData(rows, column_names, cls.get_table_title(f'{len(rows)}+', filter_dict), remaining_rows)
+
+    @classmethod
+    def get_table_title(cls, number_resources: str, filter_dict: dict) -> str:
+        return cls._get_table_title(number_resources, filter_dict)
 
     @classmethod
     @abstractmethod
-    def _get_table_title(cls, resources: list[BaseResource], filter_dict: dict) -> str:
+    def _get_table_title(cls, number_resources: str, filter_dict: dict) -> str:
         pass
 
     @classmethod
@@ -27,12 +48,12 @@ class DataProcessor(ABC):
 
     @classmethod
     @abstractmethod
-    def _get_resources(cls, workspaces: dict[str, Workspace], filter_dict: dict) -> list[BaseResource]:
+    def _get_resources(cls, workspaces: dict[str, Workspace], filter_dict: dict) -> Iterable[BaseResource]:
         pass
 
     @staticmethod
     @abstractmethod
-    def _apply_filters(resources: list[BaseResource], filter_dict: dict) -> list[BaseResource]:
+    def _apply_filters(resources: Iterable[BaseResource], filter_dict: dict) -> Iterable[BaseResource]:
         pass
 
     @classmethod
@@ -49,38 +70,149 @@ class DataProcessor(ABC):
 
 class TasksProcessor(DataProcessor):
     @classmethod
-    def _get_resources(cls, workspaces: dict[str, Workspace], filter_dict: dict) -> list[Task]:
+    def _get_resources(cls, workspaces: dict[str, Workspace], filter_dict: dict) -> Iterable[Task]:
         if filter_dict.get('workspace_id'):
-            workspaces = [workspaces[filter_dict['workspace_id']]]
+            queried_workspaces = [workspaces[filter_dict['workspace_id']]]
         else:
-            workspaces = workspaces.values()
-
-        tasks = []
+            queried_workspaces = workspaces.values()
+
+        if filter_dict.get('tags'):
+            # the tag index of the workspaces also filters by kind
+            included_tags, excluded_tags = parse_tag_filter(filter_dict['tags'])
+            task_lists = [
+                workspace.get_tagged_tasks(included_tags, excluded_tags, filter_dict.get('kind'))
+                for workspace in queried_workspaces
+            ]
+        else:
+            task_lists = [workspace.iter_ordered_tasks() for workspace in queried_workspaces]
 
-        for workspace in workspaces:
-            tasks.extend(workspace.task_dict.values())
+        if len(task_lists) == 1:
+            return task_lists[0]
 
-        return tasks
+        # the tasks of each workspace are ordered already, so they are merged lazily instead of being collected and
+        # sorted. The first rows of the table are available without going through all tasks.
+        return heapq.merge(*task_lists, key=attrgetter('sort_key'))
 
     @classmethod
-    def _get_table_title(cls, resources: list[BaseResource], filter_dict: dict) -> str:
+    def _get_table_title(cls, number_resources: str, filter_dict: dict) -> str:
         workspace_name = filter_dict.get('workspace_name', 'all')
         task_kind = filter_dict.get('task_kind', TaskKind.CURRENT)
 
-        return f'{str(filter_dict.get('kind', task_kind))}({workspace_name})[{len(resources)}]'
+        if filter_dict.get('tags'):
+            workspace_name = f'{workspace_name}, tags: {filter_dict['tags']}'
+        if filter_dict.get('hide_blocked') and filter_dict.get('kind') == TaskKind.CURRENT:
+            workspace_name = f'{workspace_name}, unblocked'
+
+        return f'{str(filter_dict.get('kind', task_kind))}({workspace_name})[{number_resources}]'
 
     @classmethod
     def _get_column_names(cls) -> list[str]:
-        column_names = ['TASK', 'PRIORITY', 'DUE', 'CREATED']
+        column_names = ['TASK', 'PRIORITY', 'DUE', 'CREATED', 'TAGS', 'BLOCKED']
 
         return column_names
 
     @staticmethod
-    def _apply_filters(resources: list[Task], filter_dict: dict) -> list[Task]:
+    def _apply_filters(resources: Iterable[Task], filter_dict: dict) -> Iterable[Task]:
+        if 'kind' in filter_dict and not filter_dict.get('tags'):
+            resources = (task for task in resources if task.kind == filter_dict['kind'])
+        if filter_dict.get('hide_blocked') and filter_dict.get('kind') == TaskKind.CURRENT:
+            resources = (task for task in resources if not task.number_open_dependencies)
+
         return resources
 
+    @staticmethod
+    def get_counts(workspaces: dict[str, Workspace], now: datetime = None) -> dict:
+        now = now or datetime.now()
+        number_current = 0
+        number_backlog = 0
+        number_due_today = 0
+        # (task id, due datetime) of current tasks that are not due yet
+        upcoming_due = []
+
+        for workspace in workspaces.values():
+            if not workspace.resident:
+                # evicted workspaces only know the due dates of their tasks, the entries get keys of their own
+                summary = workspace.summary
+                number_current += summary['number_current']
+                number_backlog += summary['number_backlog']
+
+                for i, due_date in enumerate(summary['current_due_dates']):
+                    due_datetime = datetime.strptime(due_date, Workspace._DATE_FORMAT)
+                    if (due_datetime.date() - now.date()).days < 1:
+                        number_due_today += 1
+                    else:
+                        upcoming_due.append((f'{workspace.id}/{i}', due_datetime))
+
+                continue
+
+            for task in workspace.task_dict.values():
+                if task.kind == TaskKind.CURRENT:
+                    number_current += 1
+                    if task.due_datetime and (task.due_datetime.date() - now.date()).days < 1:
+                        number_due_today += 1
+                    elif task.due_datetime:
+                        upcoming_due.append((task.id, task.due_datetime))
+                elif task.kind == TaskKind.BACKLOG:
+                    number_backlog += 1
+
+        return {
+            'number_workspaces': len(workspaces),
+            'number_current': number_current,
+            'number_backlog': number_backlog,
+            'number_due_today': number_due_today,
+            'upcoming_due': upcoming_due,
+        }
+
+    @staticmethod
+    def create_next_occurrence(task: Task, now: datetime = None) -> Task:
+        # the recurrence moves from the completed task to the next one, which is due after now. Completing a task
+        # late skips the occurrences that passed in the meantime.
+        now = now or datetime.now()
+        start = task.due_datetime or datetime.combine(now.date(), time(23, 59, 59))
+        number = 1
+
+        while (due_datetime := task.recurrence.shift(start, number)) <= now:
+            number += 1
+
+        next_task = Task(
+            name=task.name,
+            workspace_id=task.workspace_id,
+            priority=task.priority,
+            description=task.description,
+            due_datetime=due_datetime.strftime(Task._DATE_TIME_FORMAT),
+            tags=task.tags,
+            recurrence=task.recurrence,
+        )
+        task.recurrence = None
+
+        return next_task
+
+    @staticmethod
+    def get_occurrences(workspaces: dict[str, Workspace], start: date, end: date) -> list[tuple[datetime, Task]]:
+        # occurrences of the recurring tasks between start and end, they are computed for the window and not stored
+        occurrences = []
+
+        for workspace in workspaces.values():
+            for task in workspace.task_dict.values():
+                if not task.recurrence or task.kind != TaskKind.CURRENT or not task.due_datetime:
+                    continue
+
+                number = 0
+                while (occurrence := task.recurrence.shift(task.due_datetime, number)).date() <= end:
+                    if occurrence.date() >= start:
+                        occurrences.append((occurrence, task))
+                    number += 1
+
+        return sorted(occurrences, key=lambda occurrence: (occurrence[0], occurrence[1].sort_key))
+
     @staticmethod
     def _create_resource(**kwargs) -> Task:
+        if isinstance(kwargs.get('tags'), str):
+            kwargs['tags'] = parse_tags(kwargs['tags'])
+        if isinstance(kwargs.get('recurrence'), str):
+            recurrence = kwargs['recurrence'].strip().upper()
+            kwargs['recurrence'] = Granularity[recurrence] if recurrence else 0
+
         task = Task(**kwargs)
 
         return task
@@ -88,12 +220,12 @@ class TasksProcessor(DataProcessor):
 
 class WorkspacesProcessor(DataProcessor):
     @classmethod
-    def _get_table_title(cls, resources: list[BaseResource], filter_dict: dict) -> str:
-        return f'WORKSPACES[{len(resources)}])'
+    def _get_table_title(cls, number_resources: str, filter_dict: dict) -> str:
+        return f'WORKSPACES[{number_resources}])'
 
     @classmethod
-    def _get_resources(cls, workspaces: dict[str, Workspace], filter_dict: dict) -> dict[str, Workspace]:
-        return workspaces
+    def _get_resources(cls, workspaces: dict[str, Workspace], filter_dict: dict) -> list[Workspace]:
+        return list(workspaces.values())
 
     @classmethod
     def _get_column_names(cls) -> list[str]:
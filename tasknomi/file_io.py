@@ -1,12 +1,59 @@
 import json
-from os import environ
+import lzma
+import re
+import shutil
+import zlib
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Iterator
+from os import environ, replace, scandir
 from pathlib import Path
+from secrets import token_hex
+from threading import RLock
 
-from classes import AppState, BaseResource, ResourceKind, Task, TaskKind, Workspace
+from classes import AppState, BaseResource, Granularity, ResourceKind, Task, TaskKind, Workspace
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 class FileIO:
     INDENT = 4
+    TRASH_DIR_NAME = '.trash'
+    ARCHIVE_DIR_NAME = 'archive'
+    ARCHIVE_SEGMENT_SUFFIX = '.json.xz'
+    # damaged files are moved here instead of being read, `python cli.py fsck` reports them
+    QUARANTINE_DIR_NAME = '.quarantine'
+    # summaries of the workspaces of this machine, a hidden file so that it is not synced
+    SUMMARIES_FILE_NAME = '.summaries.json'
+    # files that were written or deleted since the last sync, one path relative to the data directory per line. The
+    # sync only looks at these files instead of all of them.
+    CHANGES_FILE_NAME = '.changes'
+    # gets a new token whenever the data or the config is changed by FileIO, the sync or fsck. The headless commands
+    # compare it to the token of their cached results, which only needs a single small file to be read.
+    GENERATION_FILE_NAME = '.generation'
+    # the socket of a running daemon, see daemon.py
+    DAEMON_SOCKET_FILE_NAME = '.daemon.sock'
+    # version 1 files are indented, version 2 files are compact and contain this marker. Both are read the same way.
+    FORMAT_VERSION = 2
+    FORMAT_VERSION_KEY = 'format_version'
+    # the archiver runs in a thread, task files must not be written by it and the app at the same time
+    _lock = RLock()
+    # files moved into the quarantine while loading, so that the app can tell about them
+    quarantined_paths: list[Path] = []
+    _TASK_FIELD_TYPES = {
+        'name': str,
+        'id': str,
+        'priority': (int, str),
+        'kind': int,
+        'description': str,
+        'creation_datetime': str,
+        'due_datetime': str,
+        'workspace_id': str,
+    }
+    # the creation time is only parsed when it is needed, so loading checks its format without parsing it
+    _DATE_TIME_PATTERN = re.compile(r'\d{4}/(0[1-9]|1[0-2])/(0[1-9]|[12]\d|3[01])-([01]\d|2[0-3]):[0-5]\d:[0-5]\d')
 
     @staticmethod
     def _get_app_path() -> Path:
@@ -27,80 +74,597 @@ class FileIO:
 
     @classmethod
     def write_resource(cls, resource: BaseResource) -> None:
-        if isinstance(resource, Task):
-            cls._write_task_to_file(resource)
-        elif isinstance(resource, Workspace):
-            cls._write_workspace_to_file(resource)
+        cls.write_resources([resource])
 
     @classmethod
-    def delete_resource(cls, resource_id: str, resource_kind: ResourceKind) -> None:
-        if resource_kind == ResourceKind.TASK:
-            cls._delete_task(resource_id)
-        elif resource_kind == ResourceKind.WORKSPACE:
-            cls._delete_workspace(resource_id)
+    def write_resources(cls, resources: list[BaseResource], previous_workspace_ids: dict[str, str] = None) -> None:
+        # previous_workspace_ids maps ids of moved tasks to the workspace they were stored in before
+        previous_workspace_ids = previous_workspace_ids or dict()
+        written_tasks = []
+        changed_paths = []
+
+        with cls._lock:
+            for resource in resources:
+                if isinstance(resource, Task):
+                    cls._write_task_to_file(resource)
+                    written_tasks.append(resource)
+                    changed_paths.append(cls._get_task_relative_path(resource.id, resource.workspace_id))
+                elif isinstance(resource, Workspace):
+                    cls._write_workspace_to_file(resource)
+                    changed_paths.append('workspaces.json')
+
+                # remove the old file only after the new one was written, so a task can never get lost
+                previous_workspace_id = previous_workspace_ids.get(resource.id)
+                if previous_workspace_id and previous_workspace_id != getattr(resource, 'workspace_id', None):
+                    cls._delete_task(resource.id, previous_workspace_id)
+                    changed_paths.append(cls._get_task_relative_path(resource.id, previous_workspace_id))
+                    changed_paths.extend(cls._remove_from_archive(previous_workspace_id, [resource]))
+
+            # an edited task is a loose file again, the archiver moves it back if it is still completed
+            for workspace_id, tasks in cls._group_by_workspace(written_tasks).items():
+                changed_paths.extend(cls._remove_from_archive(workspace_id, tasks))
+
+            cls.mark_changed(changed_paths)
 
     @classmethod
-    def _read(cls) -> AppState:
-        app_path = cls._get_app_path()
+    def delete_resources(cls, resources: list[BaseResource]) -> None:
+        deleted_tasks = []
+        changed_paths = []
+
+        with cls._lock:
+            for resource in resources:
+                if isinstance(resource, Task):
+                    cls._delete_task(resource.id, resource.workspace_id)
+                    deleted_tasks.append(resource)
+                    changed_paths.append(cls._get_task_relative_path(resource.id, resource.workspace_id))
+                elif isinstance(resource, Workspace):
+                    cls._delete_workspace(resource.id)
+                    # the directory stands for all files of the workspace
+                    changed_paths.extend(['workspaces.json', resource.id])
+
+            for workspace_id, tasks in cls._group_by_workspace(deleted_tasks).items():
+                changed_paths.extend(cls._remove_from_archive(workspace_id, tasks))
+
+            cls.mark_changed(changed_paths)
 
-        config_file_path = app_path / 'config.json'
-        workspace_file_path = app_path / 'workspaces.json'
-
-        with open(config_file_path, 'r') as f:
-            config_dict = json.load(f)
-
-        with open(workspace_file_path, 'r') as f:
-            workspaces_list = json.load(f)
-            workspaces = {
-                workspace['id']: Workspace(
-                    name=workspace['name'],
-                    id=workspace['id'],
-                    task_dict=dict(),
-                    creation_datetime=workspace['creation_datetime'],
+    @classmethod
+    def archive_tasks(cls, tasks: list[Task]) -> None:
+        # moves completed tasks from their own files into compressed segments, one per workspace and creation
+        # month. Archived tasks are not read on startup anymore, only when load_archived_tasks is called.
+        app_path = cls._get_app_path()
+        segment_dict = defaultdict(list)
+
+        for task in tasks:
+            segment_dict[cls._get_archive_segment_path(task)].append(task)
+
+        for segment_path, segment_tasks in segment_dict.items():
+            with cls._lock:
+                archived_task_dicts = []
+
+                for task in segment_tasks:
+                    # the file is the source of truth, the task might have been edited since it was handed over
+                    task_file_path = app_path / task.workspace_id / f'{task.id}.json'
+                    try:
+                        with open(task_file_path, 'rb') as f:
+                            task_dict = cls._decode(f.read())
+                    except FileNotFoundError:
+                        continue
+
+                    if task_dict['kind'] == TaskKind.COMPLETED:
+                        archived_task_dicts.append(task_dict)
+
+                if not archived_task_dicts:
+                    continue
+
+                segment = cls._read_archive_segment(segment_path)
+                segment.update({task_dict['id']: task_dict for task_dict in archived_task_dicts})
+                segment_path.parent.mkdir(exist_ok=True)
+                cls._write_archive_segment(segment_path, segment)
+
+                for task_dict in archived_task_dicts:
+                    (app_path / task_dict['workspace_id'] / f'{task_dict["id"]}.json').unlink(missing_ok=True)
+
+                cls.mark_changed(
+                    [
+                        segment_path.relative_to(app_path).as_posix(),
+                        *(
+                            cls._get_task_relative_path(task_dict['id'], task_dict['workspace_id'])
+                            for task_dict in archived_task_dicts
+                        ),
+                    ]
                 )
-                for workspace in workspaces_list
+
+                # tasks whose file was gone or not completed anymore were skipped
+                archived_task_ids = {task_dict['id'] for task_dict in archived_task_dicts}
+                for task in segment_tasks:
+                    if task.id in archived_task_ids:
+                        task.archived = True
+
+    @classmethod
+    def load_archived_tasks(cls, workspace: Workspace) -> None:
+        archive_path = cls._get_app_path() / workspace.id / cls.ARCHIVE_DIR_NAME
+
+        if archive_path.exists():
+            with cls._lock:
+                for segment_path in sorted(archive_path.glob(f'*{cls.ARCHIVE_SEGMENT_SUFFIX}')):
+                    try:
+                        tasks = cls.read_archive_segment_tasks(segment_path, workspace.id)
+                    except ValueError:
+                        cls.quarantine(segment_path)
+                        continue
+
+                    for task in tasks:
+                        task.archived = True
+                        # tasks that are already in memory are never older than their archived version
+                        if task.id not in workspace.task_dict:
+                            workspace.add_task(task)
+
+        workspace.archive_loaded = True
+
+    @classmethod
+    def _get_archive_segment_path(cls, task: Task, workspace_id: str = '') -> Path:
+        segment_name = f'{task.creation_datetime.strftime("%Y-%m")}{cls.ARCHIVE_SEGMENT_SUFFIX}'
+
+        return cls._get_app_path() / (workspace_id or task.workspace_id) / cls.ARCHIVE_DIR_NAME / segment_name
+
+    @staticmethod
+    def _encode(content: dict | list) -> bytes:
+        # task files are written compact, orjson is used if it is installed
+        if orjson:
+            return orjson.dumps(content)
+
+        return json.dumps(content, separators=(',', ':')).encode()
+
+    @staticmethod
+    def _decode(data: bytes) -> dict | list:
+        if orjson:
+            return orjson.loads(data)
+
+        # decoding first is faster than letting json detect the encoding of bytes
+        return json.loads(data.decode())
+
+    @classmethod
+    def _read_archive_segment(cls, segment_path: Path) -> dict[str, dict]:
+        if not segment_path.exists():
+            return dict()
+
+        with open(segment_path, 'rb') as f:
+            return cls._decode(lzma.decompress(f.read()))
+
+    @classmethod
+    def read_archive_segment_tasks(cls, segment_path: Path, workspace_id: str) -> list[Task]:
+        try:
+            segment = cls._read_archive_segment(segment_path)
+        except lzma.LZMAError as e:
+            raise ValueError(f'damaged archive: {e}')
+
+        if not isinstance(segment, dict):
+            raise ValueError('archive is not a json object')
+
+        tasks = []
+        for task_id, task_dict in segment.items():
+            task = cls._task_from_checked_dict(task_dict, workspace_id)
+            if task.id != task_id:
+                raise ValueError(f'archived task {task.id} is stored as {task_id}')
+
+            tasks.append(task)
+
+        return tasks
+
+    @classmethod
+    def _write_archive_segment(cls, segment_path: Path, segment: dict[str, dict]) -> None:
+        if not segment:
+            segment_path.unlink(missing_ok=True)
+            return
+
+        tmp_segment_path = segment_path.with_name(f'{segment_path.name}.tmp')
+
+        with open(tmp_segment_path, 'wb') as f:
+            f.write(lzma.compress(cls._encode(segment)))
+
+        replace(tmp_segment_path, segment_path)
+
+    @classmethod
+    def _remove_from_archive(cls, workspace_id: str, tasks: list[Task]) -> list[str]:
+        # returns the relative paths of the changed segments
+        segment_dict = defaultdict(list)
+        changed_paths = []
+
+        for task in tasks:
+            segment_dict[cls._get_archive_segment_path(task, workspace_id)].append(task.id)
+
+        for segment_path, task_ids in segment_dict.items():
+            # most edited tasks were never archived, so segments are only touched if they exist
+            if not segment_path.exists():
+                continue
+
+            segment = cls._read_archive_segment(segment_path)
+            removed = [segment.pop(task_id) for task_id in task_ids if task_id in segment]
+
+            if removed:
+                cls._write_archive_segment(segment_path, segment)
+                changed_paths.append(segment_path.relative_to(cls._get_app_path()).as_posix())
+
+        return changed_paths
+
+    @staticmethod
+    def _group_by_workspace(tasks: list[Task]) -> dict[str, list[Task]]:
+        workspace_task_dict = defaultdict(list)
+
+        for task in tasks:
+            workspace_task_dict[task.workspace_id].append(task)
+
+        return workspace_task_dict
+
+    @classmethod
+    def write_config(cls, app_state: AppState) -> None:
+        config_dict = {
+            'workspace_id': app_state.workspace_id,
+            'resource_kind': app_state.resource_kind,
+            'task_kind': app_state.task_kind,
+            'all_workspaces': app_state.all_workspaces,
+            'tag_filter': app_state.tag_filter,
+            'hide_blocked': app_state.hide_blocked,
+            'max_resident_workspaces': app_state.max_resident_workspaces,
+            'resident_workspace_ids': app_state.resident_workspace_ids,
+        }
+
+        cls._write_json_atomic(cls._get_app_path() / 'config.json', config_dict)
+        # the config is the default view of the query command
+        cls.bump_generation()
+
+    @classmethod
+    def load_workspace_tasks(cls, workspace: Workspace) -> None:
+        workspace_path = cls._get_app_path() / workspace.id
+        # the directory can be missing after an interrupted write or sync
+        workspace_path.mkdir(exist_ok=True)
+        task_dict = dict()
+
+        for task_file_path in workspace_path.glob('*.json'):
+            try:
+                task = cls.read_task_file(task_file_path, workspace.id)
+            except ValueError:
+                # a single damaged file must not prevent the start
+                cls.quarantine(task_file_path)
+                continue
+
+            task_dict[task.id] = task
+
+        workspace.load_tasks(task_dict)
+
+    @classmethod
+    def iter_stored_tasks(cls, workspace_ids: Iterable[str] = None) -> Iterator[Task]:
+        # all tasks on disk including the archived ones, independent of which workspaces are loaded. Damaged files
+        # are skipped, they are handled by the loader and fsck.
+        app_path = cls._get_app_path()
+
+        for workspace_dict in cls._read_workspaces_list():
+            workspace_id = workspace_dict['id']
+            if workspace_ids is not None and workspace_id not in workspace_ids:
+                continue
+
+            workspace_path = app_path / workspace_id
+            task_ids = set()
+
+            for task_file_path in workspace_path.glob('*.json'):
+                try:
+                    task = cls.read_task_file(task_file_path, workspace_id)
+                except ValueError:
+                    continue
+
+                task_ids.add(task.id)
+                yield task
+
+            archived_tasks = []
+
+            with cls._lock:
+                for segment_path in (workspace_path / cls.ARCHIVE_DIR_NAME).glob(f'*{cls.ARCHIVE_SEGMENT_SUFFIX}'):
+                    try:
+                        archived_tasks.extend(cls.read_archive_segment_tasks(segment_path, workspace_id))
+                    except ValueError:
+                        continue
+
+            # a task that is still a loose file is newer than its archived version
+            yield from (task for task in archived_tasks if task.id not in task_ids)
+
+    @classmethod
+    def write_workspace_summaries(cls, workspaces: list[Workspace]) -> None:
+        # the summaries let the next start skip reading the task files of workspaces that are not resident
+        summary_dict = {workspace.id: cls._get_workspace_summary(workspace) for workspace in workspaces}
+
+        with cls._lock:
+            workspace_ids = {workspace_dict['id'] for workspace_dict in cls._read_workspaces_list()}
+            # summaries of deleted workspaces are dropped
+            summary_dict = {
+                workspace_id: summary
+                for workspace_id, summary in (cls._read_workspace_summaries() | summary_dict).items()
+                if workspace_id in workspace_ids
             }
 
-        for workspace_id, workspace in workspaces.items():
-            for task_file_path in (app_path / workspace_id).iterdir():
-                if task_file_path.is_file():
-                    with open(task_file_path, 'r') as f:
-                        task_dict = json.load(f)
-                        task = Task(
-                            name=task_dict['name'],
-                            id=task_dict['id'],
-                            kind=TaskKind(task_dict['kind']),
-                            description=task_dict['description'],
-                            priority=task_dict['priority'],
-                            workspace_id=task_dict['workspace_id'],
-                            creation_datetime=task_dict['creation_datetime'],
-                            due_datetime=task_dict['due_datetime'],
-                        )
-
-                        workspace.task_dict[task.id] = task
+            cls._write_json_atomic(cls._get_app_path() / cls.SUMMARIES_FILE_NAME, summary_dict)
 
-        app_state = AppState(
+    @classmethod
+    def _read_workspace_summaries(cls) -> dict[str, dict]:
+        try:
+            with open(cls._get_app_path() / cls.SUMMARIES_FILE_NAME, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return dict()
+
+    @classmethod
+    def _get_workspace_summary(cls, workspace: Workspace) -> dict:
+        # the signature tells whether the task files changed since the summary was made, e.g. by a sync
+        return workspace.get_summary() | {'signature': cls.get_data_signature(cls._get_app_path() / workspace.id)}
+
+    @classmethod
+    def read_task_file(cls, file_path: Path, workspace_id: str) -> Task:
+        # raises a ValueError that describes the problem if the file is damaged or does not belong to its location
+        try:
+            with open(file_path, 'rb') as f:
+                task_dict = cls._decode(f.read())
+        except OSError as e:
+            raise ValueError(f'unreadable: {e}')
+        except ValueError as e:
+            raise ValueError(f'invalid json: {e}')
+
+        task = cls._task_from_checked_dict(task_dict, workspace_id)
+        if file_path.name != f'{task.id}.json':
+            raise ValueError(f'file name does not match the id {task.id}')
+
+        return task
+
+    @classmethod
+    def quarantine(cls, path: Path) -> Path:
+        app_path = cls._get_app_path()
+        quarantine_path = app_path / cls.QUARANTINE_DIR_NAME / path.relative_to(app_path)
+
+        with cls._lock:
+            quarantine_path.parent.mkdir(parents=True, exist_ok=True)
+
+            # never overwrite an earlier quarantined version of the same file
+            number = 1
+            while quarantine_path.exists():
+                number += 1
+                quarantine_path = quarantine_path.with_name(f'{path.name}.{number}')
+
+            replace(path, quarantine_path)
+            cls.quarantined_paths.append(quarantine_path)
+            cls.mark_changed([path.relative_to(app_path).as_posix()])
+
+        return quarantine_path
+
+    @classmethod
+    def mark_changed(cls, relative_paths: list[str], app_path: Path = None) -> None:
+        # a directory stands for all files in it
+        if not relative_paths:
+            return
+
+        with cls._lock, open((app_path or cls._get_app_path()) / cls.CHANGES_FILE_NAME, 'a') as f:
+            f.write(''.join(f'{relative_path}\n' for relative_path in relative_paths))
+
+        cls.bump_generation(app_path)
+
+    @classmethod
+    def bump_generation(cls, app_path: Path = None) -> str:
+        generation = token_hex(8)
+        generation_file_path = (app_path or cls._get_app_path()) / cls.GENERATION_FILE_NAME
+        tmp_generation_file_path = generation_file_path.with_name(f'{generation_file_path.name}.{generation}.tmp')
+
+        # a unique temporary file, the app, the daemon and the headless commands can bump at the same time
+        tmp_generation_file_path.write_text(generation)
+        replace(tmp_generation_file_path, generation_file_path)
+
+        return generation
+
+    @classmethod
+    def get_generation(cls) -> str:
+        try:
+            return (cls._get_app_path() / cls.GENERATION_FILE_NAME).read_text()
+        except FileNotFoundError:
+            # the data was written by a version that did not know the generation yet
+            return cls.bump_generation()
+
+    @classmethod
+    def get_data_signature(cls, path: Path) -> str:
+        # changes whenever a file in the directory gets written or deleted, only stats the files. crc32 is enough to
+        # detect changes and, unlike hashlib, cheap to import for the headless commands.
+        checksum = 0
+        directory_paths = [path]
+
+        while directory_paths:
+            with scandir(directory_paths.pop()) as entries:
+                for entry in sorted(entries, key=lambda e: e.name):
+                    if entry.name.startswith('.'):
+                        continue
+                    elif entry.is_dir():
+                        directory_paths.append(entry.path)
+                    else:
+                        stat = entry.stat()
+                        checksum = zlib.crc32(f'{entry.path}:{stat.st_mtime_ns}:{stat.st_size};'.encode(), checksum)
+
+        return f'{checksum:08x}'
+
+    @classmethod
+    def has_trash(cls) -> bool:
+        trash_path = cls._get_app_path() / cls.TRASH_DIR_NAME
+
+        return trash_path.exists() and any(trash_path.iterdir())
+
+    @classmethod
+    def reclaim_trash(cls) -> None:
+        # deleted workspaces are only renamed into the trash, this removes their files for real. If it gets
+        # interrupted, the remaining files stay in the trash and are removed on the next call.
+        trash_path = cls._get_app_path() / cls.TRASH_DIR_NAME
+
+        if not trash_path.exists():
+            return
+
+        for trashed_path in trash_path.iterdir():
+            if trashed_path.is_dir():
+                shutil.rmtree(trashed_path, ignore_errors=True)
+            else:
+                trashed_path.unlink(missing_ok=True)
+
+    @classmethod
+    def _write_json_atomic(cls, file_path: Path, content: dict | list) -> None:
+        # write to a temporary file first, so that an interrupted write never leaves a truncated file behind
+        tmp_file_path = file_path.with_name(f'{file_path.name}.tmp')
+
+        with open(tmp_file_path, 'w') as f:
+            json.dump(content, f, indent=cls.INDENT)
+
+        replace(tmp_file_path, file_path)
+
+    @classmethod
+    def _read_workspaces_list(cls) -> list[dict]:
+        with open(cls._get_app_path() / 'workspaces.json', 'r') as f:
+            return json.load(f)
+
+    @classmethod
+    def _read(cls) -> AppState:
+        app_path = cls._get_app_path()
+        config_dict = cls.read_config()
+        resident_workspace_ids = cls.get_resident_workspace_ids(config_dict)
+
+        summary_dict = cls._read_workspace_summaries()
+        workspaces = dict()
+
+        for workspace_dict in cls._read_workspaces_list():
+            workspace_id = workspace_dict['id']
+            summary = summary_dict.get(workspace_id)
+
+            if (
+                resident_workspace_ids is None
+                or workspace_id in resident_workspace_ids
+                or not summary
+                or summary.get('signature') != cls.get_data_signature(app_path / workspace_id)
+            ):
+                summary = None
+
+            workspace = Workspace(
+                name=workspace_dict['name'],
+                id=workspace_id,
+                task_dict=dict(),
+                creation_datetime=workspace_dict['creation_datetime'],
+                summary=summary,
+            )
+            if workspace.resident:
+                cls.load_workspace_tasks(workspace)
+
+            workspaces[workspace_id] = workspace
+
+        # workspaces without an up to date summary were read above and get evicted again by the app state
+        app_state = cls.create_app_state(config_dict, workspaces, cls.load_workspace_tasks)
+
+        return app_state
+
+    @classmethod
+    def _task_from_checked_dict(cls, task_dict: dict, workspace_id: str) -> Task:
+        if not isinstance(task_dict, dict):
+            raise ValueError('task is not a json object')
+
+        for key, field_type in cls._TASK_FIELD_TYPES.items():
+            if key not in task_dict:
+                raise ValueError(f'{key} is missing')
+            elif not isinstance(task_dict[key], field_type):
+                raise ValueError(f'{key} has the wrong type')
+
+        # fields that were added later and can be missing
+        if not isinstance(task_dict.get('completion_datetime', ''), str):
+            raise ValueError('completion_datetime has the wrong type')
+        for key in ('tags', 'depends_on'):
+            if not isinstance(task_dict.get(key, []), list) or not all(
+                isinstance(value, str) for value in task_dict.get(key, [])
+            ):
+                raise ValueError(f'{key} has the wrong type')
+
+        if task_dict['kind'] not in TaskKind:
+            raise ValueError(f'unknown kind {task_dict["kind"]}')
+        elif task_dict.get('recurrence', 0) not in (0, *Granularity):
+            raise ValueError(f'unknown recurrence {task_dict["recurrence"]}')
+        elif task_dict['workspace_id'] != workspace_id:
+            raise ValueError(f'belongs to workspace {task_dict["workspace_id"]}')
+        elif not cls._DATE_TIME_PATTERN.fullmatch(task_dict['creation_datetime']):
+            raise ValueError(f'invalid creation_datetime {task_dict["creation_datetime"]}')
+
+        # also validates the other dates
+        return cls._task_from_dict(task_dict)
+
+    @classmethod
+    def read_config(cls) -> dict:
+        with open(cls._get_app_path() / 'config.json', 'r') as f:
+            return json.load(f)
+
+    @staticmethod
+    def get_resident_workspace_ids(config_dict: dict) -> list[str] | None:
+        # only the last used workspaces get their tasks read, the others are shown by their summary. None means all.
+        max_resident_workspaces = config_dict.get('max_resident_workspaces', 0)
+
+        if not max_resident_workspaces:
+            return None
+
+        return config_dict.get('resident_workspace_ids', [])[-max_resident_workspaces:] + [config_dict['workspace_id']]
+
+    @classmethod
+    def create_app_state(
+        cls, config_dict: dict, workspaces: dict[str, Workspace], workspace_loader: Callable[[Workspace], None]
+    ) -> AppState:
+        return AppState(
             workspaces=workspaces,
             workspace_id=config_dict['workspace_id'],
             task_kind=TaskKind(config_dict['task_kind']),
             resource_kind=ResourceKind(config_dict['resource_kind']),
+            all_workspaces=config_dict.get('all_workspaces', False),
+            tag_filter=config_dict.get('tag_filter', ''),
+            hide_blocked=config_dict.get('hide_blocked', False),
+            max_resident_workspaces=config_dict.get('max_resident_workspaces', 0),
+            resident_workspace_ids=config_dict.get('resident_workspace_ids', []),
+            workspace_loader=workspace_loader,
+            workspace_evicter=lambda evicted_workspace: cls.write_workspace_summaries([evicted_workspace]),
         )
 
-        return app_state
+    @staticmethod
+    def _task_from_dict(task_dict: dict) -> Task:
+        return Task(
+            name=task_dict['name'],
+            id=task_dict['id'],
+            kind=TaskKind(task_dict['kind']),
+            description=task_dict['description'],
+            priority=task_dict['priority'],
+            workspace_id=task_dict['workspace_id'],
+            creation_datetime=task_dict['creation_datetime'],
+            due_datetime=task_dict['due_datetime'],
+            completion_datetime=task_dict.get('completion_datetime', ''),
+            tags=task_dict.get('tags'),
+            depends_on=task_dict.get('depends_on'),
+            recurrence=task_dict.get('recurrence', 0),
+        )
 
     @classmethod
     def _write_task_to_file(cls, task: Task) -> None:
         file_path = cls._get_app_path() / task.workspace_id / f'{task.id}.json'
 
-        if not file_path.exists():
-            file_path.touch()
+        task_dict = task.to_dict()
+        task_dict[cls.FORMAT_VERSION_KEY] = cls.FORMAT_VERSION
 
-        with open(file_path, 'w') as f:
-            json.dump(task.to_dict(), f, indent=4)
+        with open(file_path, 'wb') as f:
+            f.write(cls._encode(task_dict))
 
     @classmethod
     def _write_workspace_to_file(cls, workspace: Workspace) -> None:
-        pass
+        (cls._get_app_path() / workspace.id).mkdir(exist_ok=True)
+
+        workspaces_list = cls._read_workspaces_list()
+        workspace_dict = workspace.to_dict()
+
+        for i, existing_workspace_dict in enumerate(workspaces_list):
+            if existing_workspace_dict['id'] == workspace.id:
+                workspaces_list[i] = workspace_dict
+                break
+        else:
+            workspaces_list.append(workspace_dict)
+
+        cls._write_json_atomic(cls._get_app_path() / 'workspaces.json', workspaces_list)
 
     @classmethod
     def _create_first_time_data(cls) -> AppState:
@@ -121,31 +685,35 @@ class FileIO:
             workspace_id=default_workspace.id,
         )
 
-        initial_config_dict = {
-            'workspace_id': app_state.workspace_id,
-            'resource_kind': app_state.task_kind,
-            'task_kind': app_state.task_kind,
-        }
-
-        with open(config_file_path, 'w') as f:
-            json.dump(initial_config_dict, f, indent=cls.INDENT)
+        cls.write_config(app_state)
 
         with open(workspaces_file_path, 'w') as f:
             json.dump([default_workspace.to_dict()], f, indent=cls.INDENT)
+        cls.mark_changed(['workspaces.json'])
 
         return app_state
 
-    @classmethod
-    def _delete_task(cls, resource_id: str):
-        app_path = cls._get_app_path()
+    @staticmethod
+    def _get_task_relative_path(task_id: str, workspace_id: str) -> str:
+        return f'{workspace_id}/{task_id}.json'
 
-        for workspace_dir in app_path.iterdir():
-            if workspace_dir.is_dir():
-                try:
-                    (workspace_dir / f'{resource_id}.json').unlink()
-                except FileNotFoundError:
-                    pass
+    @classmethod
+    def _delete_task(cls, resource_id: str, workspace_id: str):
+        (cls._get_app_path() / workspace_id / f'{resource_id}.json').unlink(missing_ok=True)
 
     @classmethod
     def _delete_workspace(cls, resource_id: str):
-        pass
+        app_path = cls._get_app_path()
+        trash_path = app_path / cls.TRASH_DIR_NAME
+        trash_path.mkdir(exist_ok=True)
+
+        # drop the workspace from the index first: a crash afterwards only leaves an unlisted directory behind
+        workspaces_list = [
+            workspace_dict for workspace_dict in cls._read_workspaces_list() if workspace_dict['id'] != resource_id
+        ]
+        cls._write_json_atomic(app_path / 'workspaces.json', workspaces_list)
+
+        # renaming is atomic and independent of the number of tasks, the files are removed by reclaim_trash
+        workspace_path = app_path / resource_id
+        if workspace_path.exists():
+            replace(workspace_path, trash_path / resource_id)
@@ -0,0 +1,134 @@
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from os import cpu_count
+from pathlib import Path
+
+from file_io import FileIO
+from rollups import Rollups
+
+# checks the data directory for files that the app can not read, e.g. after an interrupted write or sync. Parsing
+# thousands of task files is spread over a pool of processes. Run it while the app is closed.
+
+
+@dataclass
+class Problem:
+    path: Path
+    description: str
+    # what a repair does with the path: 'quarantine' or 'create'
+    repair: str = 'quarantine'
+
+
+def check_data_directory(jobs: int = None) -> list[Problem]:
+    app_path = FileIO._get_app_path()
+    problems = []
+
+    try:
+        workspaces_list = FileIO._read_workspaces_list()
+        workspace_ids = [workspace_dict['id'] for workspace_dict in workspaces_list]
+    except (OSError, ValueError, TypeError, KeyError) as e:
+        # without the list of workspaces nothing else can be checked
+        return [Problem(app_path / 'workspaces.json', f'unreadable: {e}', repair='')]
+
+    for workspace_path in app_path.iterdir():
+        if (
+            workspace_path.is_dir()
+            and not workspace_path.name.startswith('.')
+            and workspace_path.name not in workspace_ids
+        ):
+            problems.append(Problem(workspace_path, 'directory of a workspace that is not in workspaces.json'))
+
+    task_file_paths = []
+    segment_paths = []
+
+    for workspace_id in workspace_ids:
+        workspace_path = app_path / workspace_id
+
+        if not workspace_path.is_dir():
+            problems.append(Problem(workspace_path, 'workspace directory is missing', repair='create'))
+            continue
+
+        for path in workspace_path.iterdir():
+            if path.is_file() and path.suffix == '.json':
+                task_file_paths.append(path)
+            elif path.is_dir() and path.name == FileIO.ARCHIVE_DIR_NAME:
+                for segment_path in path.iterdir():
+                    if segment_path.name.endswith(FileIO.ARCHIVE_SEGMENT_SUFFIX):
+                        segment_paths.append(segment_path)
+                    else:
+                        problems.append(Problem(segment_path, 'unexpected file in the archive'))
+            else:
+                # e.g. a leftover .tmp file of an interrupted write
+                problems.append(Problem(path, 'unexpected file'))
+
+    jobs = jobs or cpu_count() or 1
+    task_id_paths = defaultdict(list)
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        chunksize = max(1, len(task_file_paths) // (jobs * 4))
+
+        for path, task_id, description in executor.map(_check_task_file, task_file_paths, chunksize=chunksize):
+            if description:
+                problems.append(Problem(path, description))
+            else:
+                task_id_paths[task_id].append(path)
+
+        for path, description in executor.map(_check_archive_segment, segment_paths):
+            if description:
+                problems.append(Problem(path, description))
+
+    # the first file is kept, ids must be unique across all workspaces
+    for task_id, paths in task_id_paths.items():
+        for path in sorted(paths)[1:]:
+            problems.append(Problem(path, f'duplicate of task {task_id} in {sorted(paths)[0].parent.name}'))
+
+    return sorted(problems, key=lambda problem: problem.path)
+
+
+def repair(problems: list[Problem]) -> None:
+    for problem in problems:
+        if problem.repair == 'quarantine' and problem.path.exists():
+            FileIO.quarantine(problem.path)
+        elif problem.repair == 'create':
+            problem.path.mkdir(exist_ok=True)
+
+    # quarantined tasks are still counted in the statistics and the cached query results
+    if problems:
+        app_path = FileIO._get_app_path()
+        Rollups.invalidate(Rollups.get_workspace_ids(problem.path.relative_to(app_path) for problem in problems))
+        FileIO.bump_generation()
+
+
+def format_problems(problems: list[Problem], repaired: bool = False) -> str:
+    app_path = FileIO._get_app_path()
+    lines = []
+
+    for problem in problems:
+        if repaired and problem.repair:
+            action = ' (quarantined)' if problem.repair == 'quarantine' else ' (created)'
+        else:
+            action = ''
+
+        lines.append(f'{problem.path.relative_to(app_path)}: {problem.description}{action}')
+
+    lines.append(f'{len(problems)} problem(s) found')
+
+    return '\n'.join(lines)
+
+
+def _check_task_file(file_path: Path) -> tuple[Path, str, str]:
+    try:
+        task = FileIO.read_task_file(file_path, file_path.parent.name)
+    except ValueError as e:
+        return file_path, '', str(e)
+
+    return file_path, task.id, ''
+
+
+def _check_archive_segment(segment_path: Path) -> tuple[Path, str]:
+    try:
+        FileIO.read_archive_segment_tasks(segment_path, segment_path.parent.parent.name)
+    except (OSError, ValueError) as e:
+        return segment_path, str(e)
+
+    return segment_path, ''
@@ -0,0 +1,141 @@
+import json
+from argparse import Namespace
+from datetime import date, timedelta
+
+from classes import AppState, Row, TableData, TaskKind, Workspace
+from data_processors import TasksProcessor
+from file_io import FileIO
+
+# headless access to the data for scripts and status bars. Results are cached per query until the generation of the
+# data or the day changes, so repeated polling only needs to read the generation file.
+
+QUERY_CACHE_FILE_NAME = '.query_cache.json'
+# status bars poll a few queries, the oldest outputs are dropped beyond this
+MAX_CACHED_OUTPUTS = 32
+
+
+def get_query_args(args: Namespace) -> dict:
+    # the arguments that define the output, without the function of the command
+    return {key: value for key, value in vars(args).items() if key != 'function'}
+
+
+def run_query(args: Namespace) -> str:
+    query_key = json.dumps(get_query_args(args), sort_keys=True)
+    signature = f'{date.today()}:{FileIO.get_generation()}'
+    cache = _read_cache()
+
+    if cache.get('signature') != signature:
+        cache = {'signature': signature, 'outputs': dict()}
+
+    if query_key not in cache['outputs']:
+        if len(cache['outputs']) >= MAX_CACHED_OUTPUTS:
+            cache['outputs'].pop(next(iter(cache['outputs'])))
+
+        cache['outputs'][query_key] = get_output(args, FileIO.load_data())
+        _write_cache(cache)
+
+    return cache['outputs'][query_key]
+
+
+def get_output(args: Namespace, app_state: AppState, view_dict: dict = None) -> str:
+    # the defaults of the query are the view of the app, by default the one the state was loaded with
+    workspaces = app_state.workspaces
+    view_dict = view_dict or {
+        'workspace_id': app_state.workspace_id,
+        'task_kind': app_state.task_kind,
+        'tag_filter': app_state.tag_filter,
+        'hide_blocked': app_state.hide_blocked,
+    }
+
+    if args.counts:
+        counts = TasksProcessor.get_counts(workspaces)
+        counts.pop('upcoming_due')
+
+        if args.json:
+            return json.dumps(counts)
+
+        return '\n'.join(f'{name.removeprefix("number_")}: {value}' for name, value in counts.items())
+
+    if args.all_workspaces:
+        app_state.load_all_workspaces()
+        filter_dict = dict()
+        queried_workspaces = list(workspaces.values())
+    else:
+        if args.workspace:
+            workspace = next((workspace for workspace in workspaces.values() if workspace.name == args.workspace), None)
+            if workspace is None:
+                raise SystemExit(f'Workspace "{args.workspace}" does not exist!')
+            app_state.get_workspace(workspace.id)
+        else:
+            workspace = workspaces[view_dict['workspace_id']]
+
+        filter_dict = {'workspace_id': workspace.id, 'workspace_name': workspace.name}
+        queried_workspaces = [workspace]
+
+    if args.upcoming is not None:
+        return _get_upcoming_output(queried_workspaces, filter_dict.get('workspace_name', 'all'), args)
+
+    filter_dict['kind'] = TaskKind[args.kind.upper()] if args.kind else view_dict['task_kind']
+    filter_dict['tags'] = args.tags if args.tags is not None else view_dict['tag_filter']
+    filter_dict['hide_blocked'] = view_dict['hide_blocked']
+
+    if filter_dict['kind'] == TaskKind.COMPLETED:
+        for workspace in queried_workspaces:
+            if not workspace.archive_loaded:
+                FileIO.load_archived_tasks(workspace)
+
+    table_data = TasksProcessor.get_table_data(workspaces, filter_dict)
+
+    if args.json:
+        return json.dumps([{'id': row.key} | dict(zip(table_data.column_names, row.values)) for row in table_data.rows])
+
+    return _format_table(table_data)
+
+
+def _get_upcoming_output(queried_workspaces: list[Workspace], workspace_name: str, args: Namespace) -> str:
+    today = date.today()
+    occurrences = TasksProcessor.get_occurrences(
+        {workspace.id: workspace for workspace in queried_workspaces}, today, today + timedelta(days=args.upcoming)
+    )
+
+    if args.json:
+        return json.dumps(
+            [
+                {'id': task.id, 'TASK': task.name, 'DUE': task.get_date_as_str(occurrence)}
+                for occurrence, task in occurrences
+            ]
+        )
+
+    rows = [
+        Row(f'{task.id}@{task.get_date_as_str(occurrence)}', (task.get_date_as_str(occurrence), task.name))
+        for occurrence, task in occurrences
+    ]
+
+    return _format_table(TableData(rows, ['DUE', 'TASK'], f'UPCOMING({workspace_name})[{len(rows)}]'))
+
+
+def _format_table(table_data: TableData) -> str:
+    widths = [len(column_name) for column_name in table_data.column_names]
+
+    for row in table_data.rows:
+        widths = [max(width, row_width) for width, row_width in zip(widths, row.widths)]
+
+    lines = [table_data.title, '  '.join(name.ljust(width) for name, width in zip(table_data.column_names, widths))]
+    lines.extend(
+        '  '.join(str(value).ljust(width) for value, width in zip(row.values, widths)).rstrip()
+        for row in table_data.rows
+    )
+
+    return '\n'.join(lines)
+
+
+def _read_cache() -> dict:
+    try:
+        with open(FileIO._get_app_path() / QUERY_CACHE_FILE_NAME, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return dict()
+
+
+def _write_cache(cache: dict) -> None:
+    FileIO._write_json_atomic(FileIO._get_app_path() / QUERY_CACHE_FILE_NAME, cache)
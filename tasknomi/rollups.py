@@ -0,0 +1,241 @@
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from datetime import date, timedelta
+from os import replace
+from pathlib import Path, PurePosixPath
+
+from classes import Granularity, Task, TaskKind
+from file_io import FileIO
+
+# task statistics per workspace and time bucket. The counts are updated with every change of a task instead of being
+# computed from all tasks, so showing them does not depend on the size of the history. They are derived data, the
+# workspaces whose tasks were changed without the app, e.g. by a sync, are marked as stale and built again from their
+# tasks on disk when the statistics are shown.
+
+ROLLUPS_FILE_NAME = '.rollups.json'
+
+
+class Rollups:
+    VERSION = 1
+    # created and completed are counted in the bucket of the creation and completion date. Tasks that are not
+    # completed and tasks that were completed after their due date are counted in the bucket of the due date, both
+    # together are the overdue tasks once the bucket lies in the past.
+    METRICS = ('created', 'completed', 'due_open', 'completed_late')
+
+    def __init__(
+        self, workspace_dict: dict[str, dict[str, dict[str, int]]] = None, stale_workspace_ids: Iterable[str] = ()
+    ):
+        # workspace id -> metric -> bucket key -> count
+        self.workspace_dict = workspace_dict or dict()
+        self.stale_workspace_ids = set(stale_workspace_ids)
+
+    @classmethod
+    def load(cls) -> 'Rollups':
+        content = cls._read_content()
+
+        if content.get('version') == cls.VERSION:
+            return cls(content['workspaces'], content.get('stale', ()))
+
+        # nothing is known about the tasks yet
+        return cls(stale_workspace_ids=[workspace_dict['id'] for workspace_dict in FileIO._read_workspaces_list()])
+
+    @classmethod
+    def build(cls, tasks: Iterable[Task]) -> 'Rollups':
+        rollups = cls()
+
+        for task in tasks:
+            rollups._add(task, 1)
+
+        return rollups
+
+    @classmethod
+    def invalidate(cls, workspace_ids: Iterable[str], app_path: Path = None) -> None:
+        # the tasks of the workspaces were changed without the app, their rollups get built again when needed
+        content = cls._read_content(app_path)
+        stale_workspace_ids = set(content.get('stale', ())) | set(workspace_ids)
+
+        # without a file all workspaces are stale anyway
+        if content.get('version') == cls.VERSION and stale_workspace_ids != set(content.get('stale', ())):
+            cls._write_content(content | {'stale': sorted(stale_workspace_ids)}, app_path)
+
+    @staticmethod
+    def get_workspace_ids(relative_paths: Iterable[str]) -> set[str]:
+        # the tasks and archive segments of a workspace are stored in the directory named after its id
+        return {
+            PurePosixPath(relative_path).parts[0]
+            for relative_path in relative_paths
+            if len(PurePosixPath(relative_path).parts) > 1
+        }
+
+    def rebuild_stale_workspaces(self) -> None:
+        # reads all tasks of the workspaces including the archived ones, so it should not run in the event loop
+        stale_workspace_ids = set(self.stale_workspace_ids)
+        rebuilt_workspace_dict = self.build(FileIO.iter_stored_tasks(stale_workspace_ids)).workspace_dict
+
+        for workspace_id in stale_workspace_ids:
+            self.workspace_dict.pop(workspace_id, None)
+        self.workspace_dict.update(rebuilt_workspace_dict)
+        self.stale_workspace_ids -= stale_workspace_ids
+
+        self.write()
+
+    def write(self) -> None:
+        self._write_content(
+            {'version': self.VERSION, 'workspaces': self.workspace_dict, 'stale': sorted(self.stale_workspace_ids)}
+        )
+
+    def update(self, removed_tasks: Iterable[Task], added_tasks: Iterable[Task]) -> None:
+        # an edited task is removed in its old and added in its new state, which often leaves all counts as they are.
+        # Stale workspaces are skipped, their counts are built from their tasks anyway.
+        amount_counter = Counter()
+
+        for task in added_tasks:
+            if task.workspace_id not in self.stale_workspace_ids:
+                amount_counter.update((task.workspace_id, metric, key) for metric, key in self._get_task_keys(task))
+        for task in removed_tasks:
+            if task.workspace_id not in self.stale_workspace_ids:
+                amount_counter.subtract((task.workspace_id, metric, key) for metric, key in self._get_task_keys(task))
+
+        changed = False
+
+        for (workspace_id, metric, key), amount in amount_counter.items():
+            if amount:
+                self._add_count(workspace_id, metric, key, amount)
+                changed = True
+
+        if changed:
+            self.write()
+
+    def remove_workspace(self, workspace_id: str) -> None:
+        if self.workspace_dict.pop(workspace_id, None) is not None or workspace_id in self.stale_workspace_ids:
+            self.stale_workspace_ids.discard(workspace_id)
+            self.write()
+
+    def get_rows(
+        self, workspace_ids: Iterable[str], granularity: Granularity, number_buckets: int, today: date = None
+    ) -> list[tuple[str, int, int, int]]:
+        # (bucket, created, completed, overdue) for the last buckets, the current one first
+        today = today or date.today()
+        metric_dicts = [
+            self.workspace_dict[workspace_id] for workspace_id in workspace_ids if workspace_id in self.workspace_dict
+        ]
+        rows = []
+
+        for start, end in self._get_buckets(granularity, number_buckets, today):
+            key = self._get_bucket_key(granularity, start)
+
+            if end < today:
+                overdue = self._get_overdue_count(metric_dicts, key)
+            else:
+                # only the days of the current bucket that are over count
+                overdue = sum(
+                    self._get_overdue_count(metric_dicts, self._get_bucket_key(Granularity.DAY, start + timedelta(i)))
+                    for i in range((today - start).days)
+                )
+
+            rows.append(
+                (
+                    key,
+                    self._get_count(metric_dicts, 'created', key),
+                    self._get_count(metric_dicts, 'completed', key),
+                    overdue,
+                )
+            )
+
+        return rows
+
+    def _add(self, task: Task, amount: int) -> None:
+        for metric, key in self._get_task_keys(task):
+            self._add_count(task.workspace_id, metric, key, amount)
+
+    def _add_count(self, workspace_id: str, metric: str, key: str, amount: int) -> None:
+        metric_dict = self.workspace_dict.setdefault(workspace_id, {metric: dict() for metric in self.METRICS})
+        bucket_dict = metric_dict[metric]
+        count = bucket_dict.get(key, 0) + amount
+
+        if count:
+            bucket_dict[key] = count
+        else:
+            bucket_dict.pop(key, None)
+
+    @classmethod
+    def _get_task_keys(cls, task: Task) -> Iterator[tuple[str, str]]:
+        # (metric, bucket key) for all granularities
+        for metric, day in cls._get_task_dates(task):
+            for granularity in Granularity:
+                yield metric, cls._get_bucket_key(granularity, day)
+
+    @staticmethod
+    def _get_task_dates(task: Task) -> list[tuple[str, date]]:
+        task_dates = [('created', task.creation_datetime.date())]
+
+        if task.kind == TaskKind.COMPLETED:
+            # tasks that were completed before the completion time was stored count as completed on creation
+            completion_date = (task.completion_datetime or task.creation_datetime).date()
+            task_dates.append(('completed', completion_date))
+
+            if task.due_datetime and completion_date > task.due_datetime.date():
+                task_dates.append(('completed_late', task.due_datetime.date()))
+        elif task.due_datetime:
+            task_dates.append(('due_open', task.due_datetime.date()))
+
+        return task_dates
+
+    @staticmethod
+    def _get_bucket_key(granularity: Granularity, day: date) -> str:
+        if granularity == Granularity.DAY:
+            return day.isoformat()
+        elif granularity == Granularity.WEEK:
+            year, week, _ = day.isocalendar()
+            return f'{year}-W{week:02}'
+        else:
+            return f'{day.year}-{day.month:02}'
+
+    @staticmethod
+    def _get_buckets(granularity: Granularity, number_buckets: int, today: date) -> list[tuple[date, date]]:
+        # (first day, last day) of the buckets
+        buckets = []
+
+        if granularity == Granularity.DAY:
+            for i in range(number_buckets):
+                day = today - timedelta(days=i)
+                buckets.append((day, day))
+        elif granularity == Granularity.WEEK:
+            monday = today - timedelta(days=today.weekday())
+            for i in range(number_buckets):
+                start = monday - timedelta(weeks=i)
+                buckets.append((start, start + timedelta(days=6)))
+        else:
+            start = today.replace(day=1)
+            for _ in range(number_buckets):
+                next_start = (start + timedelta(days=31)).replace(day=1)
+                buckets.append((start, next_start - timedelta(days=1)))
+                start = (start - timedelta(days=1)).replace(day=1)
+
+        return buckets
+
+    @staticmethod
+    def _get_count(metric_dicts: list[dict[str, dict[str, int]]], metric: str, key: str) -> int:
+        return sum(metric_dict[metric].get(key, 0) for metric_dict in metric_dicts)
+
+    @classmethod
+    def _get_overdue_count(cls, metric_dicts: list[dict[str, dict[str, int]]], key: str) -> int:
+        return cls._get_count(metric_dicts, 'due_open', key) + cls._get_count(metric_dicts, 'completed_late', key)
+
+    @staticmethod
+    def _read_content(app_path: Path = None) -> dict:
+        try:
+            return FileIO._decode((app_path or FileIO._get_app_path()).joinpath(ROLLUPS_FILE_NAME).read_bytes())
+        except (FileNotFoundError, ValueError):
+            return dict()
+
+    @staticmethod
+    def _write_content(content: dict, app_path: Path = None) -> None:
+        # compact, the file is written after every change of the counts
+        file_path = (app_path or FileIO._get_app_path()) / ROLLUPS_FILE_NAME
+        tmp_file_path = file_path.with_name(f'{file_path.name}.tmp')
+
+        with open(tmp_file_path, 'wb') as f:
+            f.write(FileIO._encode(content))
+
+        replace(tmp_file_path, file_path)
@@ -0,0 +1,37 @@
+import heapq
+from datetime import datetime
+from itertools import count
+
+
+class DueScheduler:
+    # min-heap of the moments at which something displayed changes, e.g. the humanized due date of a task, so that
+    # widgets only need to wake up and update when the next entry is due instead of refreshing periodically
+
+    # timers don't accept a delay of 0, entries that are already due get handled after this delay
+    MIN_DELAY_SECONDS = 0.1
+
+    def __init__(self):
+        self._heap = []
+        # tie-breaker, entries themselves don't need to be comparable
+        self._counter = count()
+
+    def clear(self) -> None:
+        self._heap.clear()
+
+    def push(self, wake_datetime: datetime | None, entry) -> None:
+        if wake_datetime:
+            heapq.heappush(self._heap, (wake_datetime, next(self._counter), entry))
+
+    def get_seconds_until_next_wake(self, now: datetime) -> float | None:
+        if not self._heap:
+            return None
+
+        return max(self.MIN_DELAY_SECONDS, (self._heap[0][0] - now).total_seconds())
+
+    def pop_due_entries(self, now: datetime) -> list:
+        entries = []
+
+        while self._heap and self._heap[0][0] <= now:
+            entries.append(heapq.heappop(self._heap)[2])
+
+        return entries
@@ -1,11 +1,12 @@
-from classes import BaseResource, ResourceKind, Task, Workspace
+from classes import BaseResource, Granularity, ResourceKind, Task, Workspace
+from rollups import Rollups
 from textual.app import Binding, ComposeResult
 from textual.containers import Container, Grid
 from textual.message import Message
 from textual.screen import ModalScreen
 from textual.validation import ValidationResult
-from textual.widgets import Button, Input, Label
-from widgets import TaskModal, WorkspaceModal
+from textual.widgets import Button, DataTable, Input, Label
+from widgets import BatchTaskModal, TagFilterModal, TaskModal, WorkspaceModal
 
 
 class TaskNomiModalScreen(ModalScreen):
@@ -83,8 +84,10 @@ class CreateResourceScreen(BaseResourceScreen):
     def _submit(self) -> None:
         input_kwargs_dict = self._process_modal_inputs()
 
-        self.post_message(self.ResourceCreated(input_kwargs_dict, self.resource_kind))
-        self.dismiss(True)
+        # invalid inputs keep the modal open with the error shown
+        if input_kwargs_dict:
+            self.post_message(self.ResourceCreated(input_kwargs_dict, self.resource_kind))
+            self.dismiss(True)
 
 
 class EditResourceScreen(BaseResourceScreen):
@@ -114,6 +117,9 @@ class EditResourceScreen(BaseResourceScreen):
     def _submit(self) -> None:
         input_kwargs_dict = self._process_modal_inputs()
 
+        if not input_kwargs_dict:
+            return
+
         if isinstance(self.resource, Task):
             resource_kind = ResourceKind.TASK
         else:
@@ -123,6 +129,59 @@ class EditResourceScreen(BaseResourceScreen):
         self.dismiss(True)
 
 
+class BatchEditResourceScreen(BaseResourceScreen):
+    class ResourcesEdited(Message):
+        def __init__(self, kwargs_dict: dict, resource_ids: list[str]) -> None:
+            self.kwargs_dict = kwargs_dict
+            self.resource_ids = resource_ids
+            super().__init__()
+
+    def __init__(self, resource_ids: list[str], workspace_names: list[str], id: str = 'batch_edit_screen'):
+        super().__init__(id=id)
+        self.resource_ids = resource_ids
+        self.workspace_names = workspace_names
+
+    def compose(self) -> ComposeResult:
+        batch_modal = BatchTaskModal(self.workspace_names)
+        batch_modal.border_title = f'EDIT {len(self.resource_ids)} TASKS'
+
+        yield batch_modal
+
+    def _submit(self) -> None:
+        input_kwargs_dict = self._process_modal_inputs()
+
+        if input_kwargs_dict:
+            # only fields that were filled in are changed
+            changed_kwargs_dict = {key: value.strip() for key, value in input_kwargs_dict.items() if value.strip()}
+            # an empty form changes nothing, so nothing needs to be written
+            if changed_kwargs_dict:
+                self.post_message(self.ResourcesEdited(changed_kwargs_dict, self.resource_ids))
+            self.dismiss(True)
+
+
+class TagFilterScreen(BaseResourceScreen):
+    class TagFilterSet(Message):
+        def __init__(self, tag_filter: str) -> None:
+            self.tag_filter = tag_filter
+            super().__init__()
+
+    def __init__(self, tag_filter: str, id: str = 'tag_filter_screen'):
+        super().__init__(id=id)
+        self.tag_filter = tag_filter
+
+    def compose(self) -> ComposeResult:
+        tag_filter_modal = TagFilterModal(self.tag_filter)
+        tag_filter_modal.border_title = 'FILTER TAGS'
+
+        yield tag_filter_modal
+
+    def _submit(self) -> None:
+        input_kwargs_dict = self._process_modal_inputs()
+
+        self.post_message(self.TagFilterSet(' '.join(input_kwargs_dict['tags'].split())))
+        self.dismiss(True)
+
+
 class DeleteResourceScreen(TaskNomiModalScreen):
     BINDINGS = [
         ('escape', 'cancel_delete_resource', 'Cancel Resource Creation'),
@@ -131,20 +190,25 @@ class DeleteResourceScreen(TaskNomiModalScreen):
     ]
 
     class DeleteResource(Message):
-        def __init__(self, resource_id: str, resource_kind: ResourceKind) -> None:
-            self.resource_id = resource_id
+        def __init__(self, resource_ids: list[str], resource_kind: ResourceKind) -> None:
+            self.resource_ids = resource_ids
             self.resource_kind = resource_kind
             super().__init__()
 
-    def __init__(self, resource_kind: ResourceKind, resource_id: str, resource_name: str, id='delete_resource'):
+    def __init__(self, resource_kind: ResourceKind, resource_ids: list[str], resource_name: str, id='delete_resource'):
         super().__init__(id=id)
         self.resource_kind = resource_kind
-        self.resource_id = resource_id
+        self.resource_ids = resource_ids
         self.resource_name = resource_name
 
     def compose(self) -> ComposeResult:
+        if len(self.resource_ids) > 1:
+            question = f'Delete {self.resource_name}?'
+        else:
+            question = f'Delete {str.lower(str(self.resource_kind))} "{self.resource_name}"?'
+
         grid = Grid(
-            Label(f'Delete {str.lower(str(self.resource_kind))} "{self.resource_name}"?', id='question'),
+            Label(question, id='question'),
             Container(),
             # spaces needed for correct coloring
             Button("   Cancel   ", id="cancel", compact=True),
@@ -158,9 +222,81 @@ class DeleteResourceScreen(TaskNomiModalScreen):
 
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "delete":
-            self.post_message(self.DeleteResource(self.resource_id, self.resource_kind))
+            self.post_message(self.DeleteResource(self.resource_ids, self.resource_kind))
 
         self.dismiss(True)
 
     def action_cancel_delete_resource(self) -> None:
         self.dismiss(True)
+
+
+class StatisticsScreen(TaskNomiModalScreen):
+    BINDINGS = [
+        ('escape', 'close', 'Close Statistics'),
+        ('g', 'cycle_granularity', 'Cycle Day/Week/Month'),
+        ('a', 'toggle_all_workspaces', 'Toggle All Workspaces'),
+    ]
+    _NUMBER_BUCKETS_DICT = {Granularity.DAY: 14, Granularity.WEEK: 12, Granularity.MONTH: 12}
+
+    def __init__(
+        self,
+        rollups: Rollups,
+        workspaces: dict[str, Workspace],
+        workspace_id: str,
+        all_workspaces: bool,
+        id='statistics',
+    ):
+        super().__init__(id=id)
+        self.rollups = rollups
+        self.workspaces = workspaces
+        self.workspace_id = workspace_id
+        self.all_workspaces = all_workspaces
+        self.granularity = Granularity.DAY
+
+    def compose(self) -> ComposeResult:
+        yield Container(DataTable(cursor_type='row'), id='dialog')
+
+    def on_mount(self) -> None:
+        if self.rollups.stale_workspace_ids:
+            # the tasks of the stale workspaces are read from disk, which can take a while with a long history
+            self.query_one('#dialog').border_title = '<Statistics: loading>'
+            self.run_worker(self._rebuild_rollups, name='_rebuild_rollups', group='rollups', thread=True)
+        else:
+            self._set_content()
+
+    def _rebuild_rollups(self) -> None:
+        self.rollups.rebuild_stale_workspaces()
+        self.app.call_from_thread(self._set_content)
+
+    def _set_content(self) -> None:
+        # the content is set once the rebuild is done
+        if self.rollups.stale_workspace_ids:
+            return
+
+        if self.all_workspaces:
+            workspace_ids = list(self.workspaces)
+            workspace_name = 'all'
+        else:
+            workspace_ids = [self.workspace_id]
+            workspace_name = self.workspaces[self.workspace_id].name
+
+        rows = self.rollups.get_rows(workspace_ids, self.granularity, self._NUMBER_BUCKETS_DICT[self.granularity])
+
+        table = self.query_one(DataTable)
+        table.clear(columns=True)
+        table.add_columns(str(self.granularity), 'CREATED', 'COMPLETED', 'OVERDUE')
+        table.add_rows(rows)
+
+        self.query_one('#dialog').border_title = f'<Statistics: {workspace_name}>'
+
+    def action_cycle_granularity(self) -> None:
+        granularities = list(Granularity)
+        self.granularity = granularities[(granularities.index(self.granularity) + 1) % len(granularities)]
+        self._set_content()
+
+    def action_toggle_all_workspaces(self) -> None:
+        self.all_workspaces = not self.all_workspaces
+        self._set_content()
+
+    def action_close(self) -> None:
+        self.dismiss(True)
@@ -1,9 +1,19 @@
-from datetime import datetime
+import secrets
+from datetime import datetime, time, timedelta
 
+# ids are ULIDs: 10 characters of the creation time in ms and 16 random characters, in Crockford's base32. Sorting
+# them sorts the resources by creation. Resources created before have uuid4 ids.
+_ID_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+_ID_TIME_LENGTH = 10
+_ID_RANDOM_LENGTH = 16
+# time and random part of the last id
+_last_id_parts = (0, 0)
 
-def humanize_date(date_time: datetime | str) -> str:
+
+def humanize_date(date_time: datetime | str, now: datetime = None) -> str:
     if date_time:
-        diff = date_time.date() - datetime.now().date()
+        now = now or datetime.now()
+        diff = date_time.date() - now.date()
         days = diff.days
 
         if days == 0:
@@ -28,3 +38,80 @@ def humanize_date(date_time: datetime | str) -> str:
                 return f'{return_string} ago'
 
     return ''
+
+
+def get_start_of_day(date_time: datetime) -> datetime:
+    return datetime.combine(date_time.date(), time())
+
+
+def get_next_humanize_change(date_time: datetime | str, now: datetime = None) -> datetime | None:
+    # humanized dates only depend on the current day, so they can only change at midnight. Every day within 30 days
+    # has its own label, further away the label changes when the rounded number of months does.
+    if not date_time:
+        return None
+
+    now = now or datetime.now()
+    days = (date_time.date() - now.date()).days
+
+    if abs(days) <= 30:
+        return get_start_of_day(now) + timedelta(days=1)
+
+    # the smallest difference that still has the current number of months, round() rounds halves to the even number
+    months = round(days / 30)
+    lowest_days = 30 * months - 15 if months % 2 == 0 else 30 * months - 14
+    # the difference at which the label changes, future dates are shown in days again from 30 days on
+    changed_days = max(lowest_days - 1, 30) if days > 0 else lowest_days - 1
+
+    return get_start_of_day(now) + timedelta(days=days - changed_days)
+
+
+def parse_tags(text: str) -> list[str]:
+    return sorted(set(text.split()))
+
+
+def parse_tag_filter(tag_filter: str) -> tuple[list[str], list[str]]:
+    # 'a b !c' -> (['a', 'b'], ['c'])
+    included_tags = [tag for tag in tag_filter.split() if not tag.startswith('!')]
+    excluded_tags = [tag[1:] for tag in tag_filter.split() if tag.startswith('!') and len(tag) > 1]
+
+    return included_tags, excluded_tags
+
+
+def generate_id(now: datetime = None) -> str:
+    global _last_id_parts
+
+    timestamp = int((now or datetime.now()).timestamp() * 1000)
+    last_timestamp, last_randomness = _last_id_parts
+
+    # ids of the same ms, or after the clock was set back, continue the last one, so they stay in order
+    if timestamp <= last_timestamp:
+        timestamp, randomness = last_timestamp, last_randomness + 1
+    else:
+        randomness = secrets.randbits(5 * _ID_RANDOM_LENGTH)
+
+    _last_id_parts = timestamp, randomness
+
+    return _encode_base32(timestamp, _ID_TIME_LENGTH) + _encode_base32(randomness, _ID_RANDOM_LENGTH)
+
+
+def is_time_sortable_id(resource_id: str) -> bool:
+    return len(resource_id) == _ID_TIME_LENGTH + _ID_RANDOM_LENGTH and all(c in _ID_ALPHABET for c in resource_id)
+
+
+def get_id_time_prefix(resource_id: str) -> str:
+    return resource_id[:_ID_TIME_LENGTH]
+
+
+def encode_id_time(date_time: datetime) -> str:
+    # compares like the time part of the ids created at date_time
+    return _encode_base32(int(date_time.timestamp() * 1000), _ID_TIME_LENGTH)
+
+
+def _encode_base32(number: int, length: int) -> str:
+    characters = []
+
+    for _ in range(length):
+        number, remainder = divmod(number, 32)
+        characters.append(_ID_ALPHABET[remainder])
+
+    return ''.join(reversed(characters))
@@ -0,0 +1,463 @@
+import hashlib
+import json
+import shutil
+import zlib
+from dataclasses import dataclass, field
+from os import replace
+from pathlib import Path
+
+from file_io import FileIO
+from rollups import Rollups
+
+WORKSPACES_FILE_NAME = 'workspaces.json'
+
+
+class DataDirectory:
+    # a data directory as seen by the sync. The hashes of the files and of the inner nodes of the Merkle tree are kept
+    # in CACHE_FILE_NAME together with the hashes of the last sync. Between syncs only the files that FileIO marked as
+    # changed are hashed again, and only the nodes on their paths are updated. All files are only looked at for the
+    # first sync and for a rescan, and then only read if their size or mtime changed.
+    CACHE_FILE_NAME = '.sync.json'
+    # config.json holds the view state of a single machine and is not synced
+    _EXCLUDED_NAMES = {'config.json', CACHE_FILE_NAME}
+
+    def __init__(self, path: Path):
+        self.path = path
+        cache_file_path = path / self.CACHE_FILE_NAME
+
+        if cache_file_path.exists():
+            cache = FileIO._decode(cache_file_path.read_bytes())
+        else:
+            cache = dict()
+
+        # relative path -> [mtime_ns, size, hash]
+        self.file_dict: dict[str, list] = cache.get('files', dict())
+        # inner node -> [hash, child name -> child hash]. The key of a node is its tree path joined by '/', the root
+        # has the key ''. The tree is missing if the directory was never synced.
+        self.node_dict: dict[str, list] = cache.get('nodes', dict())
+        # relative path -> hash at the time of the last sync
+        self.synced_dict: dict[str, str] = cache.get('synced', dict())
+        # relative path -> entry id -> entry hash at the time of the last sync, for the files that are merged per entry
+        self.synced_entries_dict: dict[str, dict[str, str]] = cache.get('synced_entries', dict())
+        # size of the part of the changes file that was applied
+        self._changes_size = 0
+
+    def update_tree(self, rescan: bool = False) -> None:
+        changes_file_path = self.path / FileIO.CHANGES_FILE_NAME
+
+        try:
+            changes = changes_file_path.read_bytes()
+        except FileNotFoundError:
+            changes = b''
+        self._changes_size = len(changes)
+
+        # files can also be changed without the app, e.g. by hand, those are only found by a rescan
+        if rescan or '' not in self.node_dict:
+            self.build_tree()
+        else:
+            self.update_files(changes.decode().splitlines())
+
+    def build_tree(self) -> None:
+        file_dict = dict()
+
+        for file_path in self._iter_files():
+            relative_path = file_path.relative_to(self.path).as_posix()
+            file_dict[relative_path] = self._get_file_entry(file_path, self.file_dict.get(relative_path))
+
+        self.file_dict = file_dict
+        self.node_dict = {'': [hashlib.sha256().hexdigest(), dict()]}
+        self._update_nodes({relative_path: entry[2] for relative_path, entry in file_dict.items()})
+
+    def update_files(self, relative_paths: list[str]) -> None:
+        # hashes the files again and updates the nodes on their paths, a directory stands for all files in it
+        changed_hashes = dict()
+
+        for relative_path in dict.fromkeys(relative_paths):
+            file_path = self.path / relative_path
+
+            if not self._is_synced(relative_path):
+                continue
+
+            if relative_path in self.node_dict:
+                # the directory of a workspace, its files were the leaves below its node
+                for bucket in self.node_dict[relative_path][1]:
+                    for name in self.node_dict[f'{relative_path}/{bucket}'][1]:
+                        changed_hashes[f'{relative_path}/{name}'] = None
+
+            if file_path.is_dir():
+                for nested_file_path in file_path.rglob('*'):
+                    nested_relative_path = nested_file_path.relative_to(self.path).as_posix()
+                    if nested_file_path.is_file() and self._is_synced(nested_relative_path):
+                        changed_hashes[nested_relative_path] = None
+            else:
+                changed_hashes[relative_path] = None
+
+        for relative_path in changed_hashes:
+            file_path = self.path / relative_path
+
+            if file_path.is_file():
+                self.file_dict[relative_path] = self._get_file_entry(file_path, None)
+                changed_hashes[relative_path] = self.file_dict[relative_path][2]
+            else:
+                self.file_dict.pop(relative_path, None)
+
+        self._update_nodes(changed_hashes)
+
+    def get_children(self, tree_path: list[str]) -> dict[str, str]:
+        node = self.node_dict.get('/'.join(tree_path))
+
+        return node[1] if node else dict()
+
+    def is_inner_node(self, tree_path: list[str]) -> bool:
+        return '/'.join(tree_path) in self.node_dict
+
+    def write_cache(self) -> None:
+        cache_file_path = self.path / self.CACHE_FILE_NAME
+        tmp_cache_file_path = cache_file_path.with_name(f'{cache_file_path.name}.tmp')
+
+        # the cache contains every file, json.dump would be much slower than the codec of the task files
+        with open(tmp_cache_file_path, 'wb') as f:
+            f.write(
+                FileIO._encode(
+                    {
+                        'files': self.file_dict,
+                        'nodes': self.node_dict,
+                        'synced': self.synced_dict,
+                        'synced_entries': self.synced_entries_dict,
+                    }
+                )
+            )
+
+        replace(tmp_cache_file_path, cache_file_path)
+
+        # the applied changes are part of the cache now, changes that were marked in the meantime are kept
+        changes_file_path = self.path / FileIO.CHANGES_FILE_NAME
+        applied_size = self._changes_size
+        self._changes_size = 0
+
+        if changes_file_path.exists():
+            remaining_changes = changes_file_path.read_bytes()[applied_size:]
+
+            if remaining_changes:
+                changes_file_path.write_bytes(remaining_changes)
+            else:
+                changes_file_path.unlink()
+
+    def get_mtime(self, relative_path: str) -> int:
+        return (self.path / relative_path).stat().st_mtime_ns
+
+    def _update_nodes(self, changed_hashes: dict[str, str | None]) -> None:
+        # sets the hashes of the changed files, None for deleted ones, and computes the hashes of the nodes above them
+        changed_node_keys = set()
+
+        for relative_path, file_hash in changed_hashes.items():
+            tree_path = self._get_tree_path(relative_path)
+
+            for depth in range(len(tree_path) - 1):
+                node_key = '/'.join(tree_path[: depth + 1])
+                self.node_dict.setdefault(node_key, ['', dict()])
+                changed_node_keys.add(node_key)
+            changed_node_keys.add('')
+
+            children = self.node_dict['/'.join(tree_path[:-1])][1]
+            if file_hash is None:
+                children.pop(tree_path[-1], None)
+            else:
+                children[tree_path[-1]] = file_hash
+
+        # children first, the keys of deeper nodes contain more separators
+        for node_key in sorted(changed_node_keys, key=lambda key: key.count('/') + bool(key), reverse=True):
+            node = self.node_dict[node_key]
+
+            if not node[1] and node_key:
+                # a node without children, e.g. the one of a deleted workspace, is removed
+                del self.node_dict[node_key]
+            else:
+                sha = hashlib.sha256()
+                for name in sorted(node[1]):
+                    sha.update(f'{name}:{node[1][name]};'.encode())
+                node[0] = sha.hexdigest()
+
+            if node_key:
+                parent_key, _, name = node_key.rpartition('/')
+                parent_children = self.node_dict[parent_key][1]
+
+                if node_key in self.node_dict:
+                    parent_children[name] = node[0]
+                else:
+                    parent_children.pop(name, None)
+
+    def _is_synced(self, relative_path: str) -> bool:
+        # hidden entries are internal, e.g. the trash of deleted workspaces
+        name = relative_path.split('/', 1)[0]
+
+        return not (name in self._EXCLUDED_NAMES or name.startswith('.') or relative_path.endswith('.tmp'))
+
+    def _iter_files(self):
+        for path in self.path.iterdir():
+            if not self._is_synced(path.name):
+                continue
+
+            if path.is_file():
+                yield path
+            elif path.is_dir():
+                for file_path in path.rglob('*'):
+                    if file_path.is_file() and not file_path.name.endswith('.tmp'):
+                        yield file_path
+
+    @staticmethod
+    def _get_file_entry(file_path: Path, cached: list | None) -> list:
+        stat = file_path.stat()
+
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            file_hash = cached[2]
+        else:
+            file_hash = hashlib.sha256(file_path.read_bytes()).hexdigest()
+
+        return [stat.st_mtime_ns, stat.st_size, file_hash]
+
+    @staticmethod
+    def _get_tree_path(relative_path: str) -> list[str]:
+        # workspace -> bucket -> file, the buckets keep the number of children per node small for large workspaces.
+        # The bucket is derived from a checksum of the path, the first characters of time sortable ids are the same
+        # for all files.
+        parts = relative_path.split('/', 1)
+
+        if len(parts) == 1:
+            return parts
+
+        workspace_id, workspace_relative_path = parts
+        bucket = f'{zlib.crc32(workspace_relative_path.encode()) & 0xFF:02x}'
+
+        return [workspace_id, bucket, workspace_relative_path]
+
+    @staticmethod
+    def get_relative_path(tree_path: list[str]) -> str:
+        if len(tree_path) == 1:
+            return tree_path[0]
+
+        return f'{tree_path[0]}/{tree_path[2]}'
+
+
+@dataclass
+class SyncResult:
+    copied_to_source: list[str] = field(default_factory=list)
+    copied_to_target: list[str] = field(default_factory=list)
+    deleted: list[str] = field(default_factory=list)
+    merged: list[str] = field(default_factory=list)
+
+
+def diff_trees(directory_a: DataDirectory, directory_b: DataDirectory, tree_path: list[str] = None) -> list[str]:
+    # only descends into nodes whose hashes differ, so the work depends on the number of changes
+    tree_path = tree_path or []
+    children_a = directory_a.get_children(tree_path)
+    children_b = directory_b.get_children(tree_path)
+    differing_paths = []
+
+    for name in sorted(children_a.keys() | children_b.keys()):
+        if children_a.get(name) == children_b.get(name):
+            continue
+
+        child_tree_path = tree_path + [name]
+        if directory_a.is_inner_node(child_tree_path) or directory_b.is_inner_node(child_tree_path):
+            differing_paths.extend(diff_trees(directory_a, directory_b, child_tree_path))
+        else:
+            differing_paths.append(DataDirectory.get_relative_path(child_tree_path))
+
+    return differing_paths
+
+
+def sync(source_path: Path, target_path: Path, rescan: bool = False) -> SyncResult:
+    source = DataDirectory(source_path)
+    target = DataDirectory(target_path)
+    source.update_tree(rescan)
+    target.update_tree(rescan)
+    result = SyncResult()
+    differing_paths = diff_trees(source, target)
+
+    for relative_path in differing_paths:
+        source_hash = _get_hash(source, relative_path)
+        target_hash = _get_hash(target, relative_path)
+        # the last synced version is only known if both directories agree on it
+        base_hash = source.synced_dict.get(relative_path)
+        if base_hash != target.synced_dict.get(relative_path):
+            base_hash = None
+
+        if source_hash == target_hash:
+            continue
+        elif source_hash is None and target_hash == base_hash:
+            _delete(target, relative_path)
+            result.deleted.append(relative_path)
+        elif target_hash is None and source_hash == base_hash:
+            _delete(source, relative_path)
+            result.deleted.append(relative_path)
+        elif target_hash is None or target_hash == base_hash:
+            _copy(source, target, relative_path)
+            result.copied_to_target.append(relative_path)
+        elif source_hash is None or source_hash == base_hash:
+            _copy(target, source, relative_path)
+            result.copied_to_source.append(relative_path)
+        else:
+            _merge(source, target, relative_path)
+            result.merged.append(relative_path)
+
+    # the statistics and the cached query results do not know about the synced changes
+    if result.copied_to_source or result.copied_to_target or result.deleted or result.merged:
+        changed_workspace_ids = Rollups.get_workspace_ids(differing_paths)
+        Rollups.invalidate(changed_workspace_ids, source_path)
+        Rollups.invalidate(changed_workspace_ids, target_path)
+        FileIO.bump_generation(source_path)
+        FileIO.bump_generation(target_path)
+
+    # both directories are equal now, so the current state is the base of the next sync
+    for data_directory in (source, target):
+        data_directory.update_files(differing_paths)
+
+    synced_dict = {relative_path: entry[2] for relative_path, entry in source.file_dict.items()}
+    synced_entries_dict = _get_synced_entries_dict(source, synced_dict)
+
+    for data_directory in (source, target):
+        data_directory.synced_dict = synced_dict
+        data_directory.synced_entries_dict = synced_entries_dict
+        data_directory.write_cache()
+
+    return result
+
+
+def _get_hash(data_directory: DataDirectory, relative_path: str) -> str | None:
+    cached = data_directory.file_dict.get(relative_path)
+
+    return cached[2] if cached else None
+
+
+def _copy(from_directory: DataDirectory, to_directory: DataDirectory, relative_path: str) -> None:
+    to_file_path = to_directory.path / relative_path
+    to_file_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file_path = to_file_path.with_name(f'{to_file_path.name}.tmp')
+
+    # copy2 keeps the mtime, which is used to resolve conflicts
+    shutil.copy2(from_directory.path / relative_path, tmp_file_path)
+    replace(tmp_file_path, to_file_path)
+
+
+def _delete(data_directory: DataDirectory, relative_path: str) -> None:
+    file_path = data_directory.path / relative_path
+    file_path.unlink(missing_ok=True)
+
+    # remove directories of deleted workspaces as well
+    parent_path = file_path.parent
+    while parent_path != data_directory.path and not any(parent_path.iterdir()):
+        parent_path.rmdir()
+        parent_path = parent_path.parent
+
+
+def _merge(source: DataDirectory, target: DataDirectory, relative_path: str) -> None:
+    # both sides changed since the last sync
+    if source.get_mtime(relative_path) >= target.get_mtime(relative_path):
+        newer, older = source, target
+    else:
+        newer, older = target, source
+
+    # the entries of the last synced version, only known if both directories agree on it
+    base_entries = dict()
+    if source.synced_dict.get(relative_path) == target.synced_dict.get(relative_path):
+        base_entries = source.synced_entries_dict.get(relative_path, dict())
+
+    if _is_merged_per_entry(relative_path):
+        # workspaces and the tasks of archive segments are merged by their id, the order of the newer file is kept
+        entries = _merge_entries(
+            base_entries, _read_entries(newer.path / relative_path), _read_entries(older.path / relative_path)
+        )
+
+        _write_entries(newer.path / relative_path, entries)
+        # a segment without tasks gets removed
+        if (newer.path / relative_path).exists():
+            _copy(newer, older, relative_path)
+        else:
+            _delete(older, relative_path)
+    else:
+        # a single task, the version that was modified last wins
+        _copy(newer, older, relative_path)
+
+
+def _merge_entries(
+    base_entries: dict[str, str], newer_entries: dict[str, dict], older_entries: dict[str, dict]
+) -> dict[str, dict]:
+    # three way merge against the hashes of the last synced entries. An entry that is missing on one side was
+    # deleted there if it existed at the last sync, it is only kept if the other side changed it since. Entries that
+    # were changed on both sides are taken from the newer file.
+    merged = dict()
+
+    for entry_id in [*newer_entries, *(entry_id for entry_id in older_entries if entry_id not in newer_entries)]:
+        newer_entry = newer_entries.get(entry_id)
+        older_entry = older_entries.get(entry_id)
+        base_hash = base_entries.get(entry_id)
+
+        if newer_entry is None or older_entry is None:
+            entry = newer_entry or older_entry
+            if base_hash is None or _get_entry_hash(entry) != base_hash:
+                merged[entry_id] = entry
+        elif _get_entry_hash(newer_entry) == base_hash:
+            merged[entry_id] = older_entry
+        else:
+            merged[entry_id] = newer_entry
+
+    return merged
+
+
+def _get_synced_entries_dict(data_directory: DataDirectory, synced_dict: dict[str, str]) -> dict[str, dict[str, str]]:
+    # the entries of unchanged files are taken from the last sync, only changed files are read
+    synced_entries_dict = dict()
+
+    for relative_path, file_hash in synced_dict.items():
+        if not _is_merged_per_entry(relative_path):
+            continue
+
+        if (
+            data_directory.synced_dict.get(relative_path) == file_hash
+            and relative_path in data_directory.synced_entries_dict
+        ):
+            synced_entries_dict[relative_path] = data_directory.synced_entries_dict[relative_path]
+        else:
+            synced_entries_dict[relative_path] = {
+                entry_id: _get_entry_hash(entry)
+                for entry_id, entry in _read_entries(data_directory.path / relative_path).items()
+            }
+
+    return synced_entries_dict
+
+
+def _is_merged_per_entry(relative_path: str) -> bool:
+    return relative_path == WORKSPACES_FILE_NAME or relative_path.endswith(FileIO.ARCHIVE_SEGMENT_SUFFIX)
+
+
+def _read_entries(file_path: Path) -> dict[str, dict]:
+    if file_path.name == WORKSPACES_FILE_NAME:
+        return {workspace_dict['id']: workspace_dict for workspace_dict in _read_json(file_path)}
+
+    return FileIO._read_archive_segment(file_path)
+
+
+def _write_entries(file_path: Path, entries: dict[str, dict]) -> None:
+    if file_path.name == WORKSPACES_FILE_NAME:
+        _write_json(file_path, list(entries.values()))
+    else:
+        FileIO._write_archive_segment(file_path, entries)
+
+
+def _get_entry_hash(entry: dict) -> str:
+    return hashlib.sha256(json.dumps(entry, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _read_json(file_path: Path) -> list | dict:
+    with open(file_path, 'r') as f:
+        return json.load(f)
+
+
+def _write_json(file_path: Path, content: list | dict) -> None:
+    tmp_file_path = file_path.with_name(f'{file_path.name}.tmp')
+
+    with open(tmp_file_path, 'w') as f:
+        json.dump(content, f, indent=FileIO.INDENT)
+
+    replace(tmp_file_path, file_path)
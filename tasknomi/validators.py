@@ -1,5 +1,6 @@
 from datetime import datetime
 
+from classes import Granularity, TaskKind
 from textual.validation import ValidationResult, Validator
 
 
@@ -22,3 +23,47 @@ class DueDateValidator(Validator):
             return self.failure('Date is not in the correct format!')
         else:
             return self.success()
+
+
+class TaskKindValidator(Validator):
+    def validate(self, value: str) -> ValidationResult:
+        if not value or value.upper() in TaskKind.__members__:
+            return self.success()
+        else:
+            return self.failure('Kind needs to be current, completed or backlog!')
+
+
+class RecurrenceValidator(Validator):
+    def validate(self, value: str) -> ValidationResult:
+        if not value or value.upper() in Granularity.__members__:
+            return self.success()
+        else:
+            return self.failure('Repeat needs to be day, week or month!')
+
+
+class WorkspaceNameValidator(Validator):
+    def __init__(self, workspace_names: list[str]):
+        self.workspace_names = workspace_names
+
+        super().__init__()
+
+    def validate(self, value: str) -> ValidationResult:
+        if not value or value in self.workspace_names:
+            return self.success()
+        else:
+            return self.failure('Workspace does not exist!')
+
+
+class UniqueWorkspaceNameValidator(Validator):
+    def __init__(self, taken_names: list[str]):
+        self.taken_names = taken_names
+
+        super().__init__()
+
+    def validate(self, value: str) -> ValidationResult:
+        if not value:
+            return self.failure('You need to set a workspace name!')
+        elif value in self.taken_names:
+            return self.failure('Workspace already exists!')
+        else:
+            return self.success()
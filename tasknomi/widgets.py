@@ -1,14 +1,24 @@
 from datetime import datetime
+from itertools import chain, islice
 
-from classes import ResourceKind, TableData, Task, TaskKind, Workspace
+from classes import BaseResource, ResourceKind, Row, Task, TaskKind, Workspace
 from data_processors import DataProcessor, TasksProcessor, WorkspacesProcessor
 from rich.text import Text
+from scheduler import DueScheduler
+from services import get_start_of_day
 from textual.app import ComposeResult
 from textual.containers import Container, HorizontalGroup, VerticalGroup
 from textual.coordinate import Coordinate
 from textual.message import Message
 from textual.widgets import Button, DataTable, Input, Label
-from validators import DueDateValidator, TaskNameValidator
+from validators import (
+    DueDateValidator,
+    RecurrenceValidator,
+    TaskKindValidator,
+    TaskNameValidator,
+    UniqueWorkspaceNameValidator,
+    WorkspaceNameValidator,
+)
 
 
 class AppStateMixin:
@@ -33,7 +43,13 @@ class AppStateMixin:
         return self.app.state.resource_kind
 
     def get_current_filter_dict(self) -> dict:
-        if self.app.state.resource_kind == ResourceKind.TASK:
+        if self.app.state.resource_kind == ResourceKind.TASK and self.app.state.all_workspaces:
+            return {
+                'kind': self.app.state.task_kind,
+                'tags': self.app.state.tag_filter,
+                'hide_blocked': self.app.state.hide_blocked,
+            }
+        elif self.app.state.resource_kind == ResourceKind.TASK:
             workspaces = self.app.state.workspaces
             workspace_id = self.app.state.workspace_id
             current_workspace_name = workspaces[workspace_id].name
@@ -42,6 +58,8 @@ class AppStateMixin:
                 'workspace_id': workspace_id,
                 'workspace_name': current_workspace_name,
                 'kind': self.app.state.task_kind,
+                'tags': self.app.state.tag_filter,
+                'hide_blocked': self.app.state.hide_blocked,
             }
         else:
             return dict()
@@ -52,6 +70,17 @@ class Overview(DataTable, AppStateMixin):
         ('ctrl+d', 'delete_resource', 'Delete Resource'),
         ('ctrl+t', 'create_task', 'Create Task'),
         ('e', 'edit_resource', 'Edit Resource'),
+        ('space', 'toggle_select', 'Select Resource'),
+        ('ctrl+a', 'toggle_select_all', 'Select All Resources'),
+        ('b', 'batch_edit', 'Batch Edit Tasks'),
+        ('ctrl+n', 'create_workspace', 'Create Workspace'),
+        ('w', 'toggle_resource_kind', 'Toggle Tasks/Workspaces'),
+        ('k', 'cycle_task_kind', 'Cycle Task Kind'),
+        ('a', 'toggle_all_workspaces', 'Toggle All Workspaces'),
+        ('s', 'show_statistics', 'Show Statistics'),
+        ('t', 'filter_tags', 'Filter Tasks by Tags'),
+        ('d', 'toggle_dependencies', 'Toggle Selected Tasks as Dependencies'),
+        ('h', 'toggle_hide_blocked', 'Toggle Hiding Blocked Tasks'),
     ]
 
     class OpenCreateModal(Message):
@@ -60,8 +89,8 @@ class Overview(DataTable, AppStateMixin):
             super().__init__()
 
     class OpenDeleteModal(Message):
-        def __init__(self, resource_id: str, resource_name: str, resource_kind: ResourceKind) -> None:
-            self.resource_id = resource_id
+        def __init__(self, resource_ids: list[str], resource_name: str, resource_kind: ResourceKind) -> None:
+            self.resource_ids = resource_ids
             self.resource_name = resource_name
             self.resource_kind = resource_kind
             super().__init__()
@@ -72,34 +101,203 @@ class Overview(DataTable, AppStateMixin):
             self.resource_kind = resource_kind
             super().__init__()
 
+    class ResourceKindToggled(Message):
+        pass
+
+    class TaskKindCycled(Message):
+        pass
+
+    class AllWorkspacesToggled(Message):
+        pass
+
+    class OpenStatistics(Message):
+        pass
+
+    class OpenTagFilterModal(Message):
+        pass
+
+    class DependenciesToggled(Message):
+        def __init__(self, task_id: str, dependency_ids: list[str]) -> None:
+            self.task_id = task_id
+            self.dependency_ids = dependency_ids
+            super().__init__()
+
+    class HideBlockedToggled(Message):
+        pass
+
+    class WorkspaceSelected(Message):
+        def __init__(self, workspace_id: str) -> None:
+            self.workspace_id = workspace_id
+            super().__init__()
+
+    class OpenBatchEditModal(Message):
+        def __init__(self, resource_ids: list[str]) -> None:
+            self.resource_ids = resource_ids
+            super().__init__()
+
+    _SELECTED_STYLE = '#ffff66 bold'
+
+    def __init__(self, *args, **kwargs):
+        self.selected_keys = set()
+        self.scheduler = DueScheduler()
+        self._scheduler_timer = None
+        self._remaining_rows = None
+        self._content_widths = []
+        self._filter_dict = dict()
+
+        super().__init__(*args, **kwargs)
+
     def set_content(self, highlighted_row: int = 0):
         self.clear(columns=True)
 
         data_processor = self.get_current_data_processor()
         workspaces = self.get_current_workspaces()
-        table_data = data_processor.get_table_data(workspaces, self.get_current_filter_dict())
-        widths = self._calculate_column_widths(table_data, self.size.width)
+        filter_dict = self.get_current_filter_dict()
 
-        for column_name, width in zip(table_data.column_names, widths):
-            self.add_column(label=column_name, key=column_name, width=width)
+        if self.get_resource_kind() == ResourceKind.TASK and self.app.state.all_workspaces:
+            # the tasks of all workspaces are added page by page, when the cursor gets close to the last row
+            limit = highlighted_row + self._get_page_size()
+        else:
+            limit = None
+
+        table_data = data_processor.get_table_data(workspaces, filter_dict, limit=limit)
+        self._remaining_rows = table_data.remaining_rows
+        self._filter_dict = filter_dict
+        self._content_widths = self._get_content_widths(
+            [len(column_name) for column_name in table_data.column_names], table_data.rows
+        )
+        self._add_columns(table_data.column_names)
 
-        for row in table_data.rows:
-            self.add_row(*row.values, key=row.key)
+        # drop selections of resources that are not displayed anymore
+        self.selected_keys.intersection_update(row.key for row in table_data.rows)
+
+        self._add_rows(table_data.rows)
 
         self.border_title = table_data.title
         self.move_cursor(row=highlighted_row)
+        self.scheduler.clear()
+        self._schedule_date_updates(table_data.rows)
+
+    def _add_columns(self, column_names: list[str]) -> None:
+        widths = self._calculate_column_widths(self._content_widths, self.size.width)
+
+        for column_name, width in zip(column_names, widths):
+            self.add_column(label=column_name, key=column_name, width=width)
+
+    def _add_rows(self, rows: list[Row]) -> None:
+        for row in rows:
+            values = row.values
+            if row.key in self.selected_keys:
+                values = (self._style_selected(values[0]), *values[1:])
+
+            self.add_row(*values, key=row.key)
+
+    def _get_page_size(self) -> int:
+        # two screens, so that there is always something to scroll to
+        return max(50, self.size.height * 2)
+
+    def _add_next_page(self) -> None:
+        rows = list(islice(self._remaining_rows, self._get_page_size() + 1))
+
+        if len(rows) > self._get_page_size():
+            self._remaining_rows = chain([rows.pop()], self._remaining_rows)
+            number_rows = f'{self.row_count + len(rows)}+'
+        else:
+            self._remaining_rows = None
+            number_rows = str(self.row_count + len(rows))
+
+        content_widths = self._get_content_widths(self._content_widths, rows)
+
+        if content_widths != self._content_widths:
+            # the columns are sized to the rows added before, they are added again to fit the wider cells
+            self._content_widths = content_widths
+            self._add_columns_again()
+
+        self._add_rows(rows)
+
+        self.border_title = self.get_current_data_processor().get_table_title(number_rows, self._filter_dict)
+        self._schedule_date_updates(rows)
+
+    def _add_columns_again(self) -> None:
+        # the cells of the table are kept as they are, e.g. with updated due dates and selections
+        cursor_row = self.cursor_row
+        column_names = [column.key.value for column in self.ordered_columns]
+        rows = [(row.key, self.get_row(row.key)) for row in self.ordered_rows]
+
+        self.clear(columns=True)
+        self._add_columns(column_names)
+
+        for row_key, values in rows:
+            self.add_row(*values, key=row_key.value)
+
+        self.move_cursor(row=cursor_row)
+
+    def on_data_table_row_highlighted(self, event: DataTable.RowHighlighted) -> None:
+        if self._remaining_rows is not None and event.cursor_row >= self.row_count - self._get_page_size() // 2:
+            self._add_next_page()
+
+    def _schedule_date_updates(self, rows: list[Row]) -> None:
+        for row in rows:
+            self.scheduler.push(row.next_date_change, row.key)
+
+        self._start_scheduler_timer(datetime.now())
+
+    def _start_scheduler_timer(self, now: datetime) -> None:
+        if self._scheduler_timer:
+            self._scheduler_timer.stop()
+
+        delay = self.scheduler.get_seconds_until_next_wake(now)
+        self._scheduler_timer = self.set_timer(delay, self._update_due_dates) if delay is not None else None
+
+    def _update_due_dates(self) -> None:
+        # only the rows whose humanized dates changed get updated, the rest of the table stays untouched
+        now = datetime.now()
+
+        for row_key in self.scheduler.pop_due_entries(now):
+            resource = self._get_resource(row_key)
+            if resource is None:
+                continue
+
+            # the cells are rendered by the resource, e.g. the due date of a recurring task contains its rule. The
+            # cached row is from the previous day, so a new one with the next change is created.
+            row = resource.to_row()
+            for column_index in row.dates:
+                self.update_cell(row_key, self.ordered_columns[column_index].key, row.values[column_index])
+            self.scheduler.push(row.next_date_change, row_key)
+
+        self._start_scheduler_timer(now)
+
+    def _get_resource(self, resource_id: str) -> BaseResource | None:
+        workspaces = self.get_current_workspaces()
+
+        if self.get_resource_kind() == ResourceKind.WORKSPACE:
+            return workspaces.get(resource_id)
+
+        return next(
+            (
+                workspace.task_dict[resource_id]
+                for workspace in workspaces.values()
+                if resource_id in workspace.task_dict
+            ),
+            None,
+        )
 
     @staticmethod
-    def _calculate_column_widths(table_data: TableData, overview_width: int) -> list[int]:
-        # by default the data table will not fill the whole screen
-        max_widths = [len(column_name) for column_name in table_data.column_names]
+    def _get_content_widths(widths: list[int], rows: list[Row]) -> list[int]:
+        # the widest cell of each column, including the widths of the rows before
+        max_widths = widths.copy()
+
+        for row in rows:
+            for i, width in enumerate(row.widths):
+                max_widths[i] = max(max_widths[i], width)
 
-        for row in table_data.rows:
-            for i, value in enumerate(row.values):
-                max_widths[i] = max(max_widths[i], len(value))
+        return max_widths
 
+    @staticmethod
+    def _calculate_column_widths(max_widths: list[int], overview_width: int) -> list[int]:
+        # by default the data table will not fill the whole screen
         # 3: padding left right of table (not related to css), between each row there is a distance of 2
-        unfilled = max(0, overview_width - sum(max_widths) - 3 - (len(table_data.column_names) - 1) * 2)
+        unfilled = max(0, overview_width - sum(max_widths) - 3 - (len(max_widths) - 1) * 2)
         add_to_all = unfilled // len(max_widths)
         rest = unfilled % len(max_widths)
 
@@ -114,22 +312,113 @@ class Overview(DataTable, AppStateMixin):
 
         return widths
 
+    def _style_selected(self, value: str | Text) -> Text:
+        return Text(str(value), style=self._SELECTED_STYLE)
+
+    def _get_highlighted_resource_id(self) -> str:
+        cell_key = self.coordinate_to_cell_key(Coordinate(column=self.cursor_column, row=self.cursor_row))
+
+        return cell_key.row_key.value
+
+    def _set_selected(self, resource_id: str, selected: bool) -> None:
+        first_column_key = self.ordered_columns[0].key
+        value = self.get_cell(resource_id, first_column_key)
+
+        if selected:
+            self.selected_keys.add(resource_id)
+            self.update_cell(resource_id, first_column_key, self._style_selected(value))
+        else:
+            self.selected_keys.discard(resource_id)
+            self.update_cell(resource_id, first_column_key, str(value))
+
+    def clear_selection(self) -> None:
+        # the table gets rebuilt after every batch operation, so no need to restyle the cells
+        self.selected_keys.clear()
+
     def on_mount(self) -> None:
         self.add_column(label='Loading Data')
 
+    def on_data_table_row_selected(self, event: DataTable.RowSelected) -> None:
+        if self.get_resource_kind() == ResourceKind.WORKSPACE:
+            self.post_message(self.WorkspaceSelected(event.row_key.value))
+
+    def action_create_workspace(self) -> None:
+        self.post_message(self.OpenCreateModal(ResourceKind.WORKSPACE))
+
+    def action_toggle_resource_kind(self) -> None:
+        self.post_message(self.ResourceKindToggled())
+
+    def action_toggle_all_workspaces(self) -> None:
+        if self.get_resource_kind() == ResourceKind.TASK:
+            self.post_message(self.AllWorkspacesToggled())
+
+    def action_toggle_dependencies(self) -> None:
+        # the highlighted task depends on the selected tasks
+        if self.get_resource_kind() == ResourceKind.TASK and self.row_count:
+            task_id = self._get_highlighted_resource_id()
+            dependency_ids = [resource_id for resource_id in self.selected_keys if resource_id != task_id]
+
+            if dependency_ids:
+                self.post_message(self.DependenciesToggled(task_id, dependency_ids))
+
+    def action_toggle_hide_blocked(self) -> None:
+        if self.get_resource_kind() == ResourceKind.TASK:
+            self.post_message(self.HideBlockedToggled())
+
+    def action_filter_tags(self) -> None:
+        if self.get_resource_kind() == ResourceKind.TASK:
+            self.post_message(self.OpenTagFilterModal())
+
+    def action_show_statistics(self) -> None:
+        self.post_message(self.OpenStatistics())
+
+    def action_cycle_task_kind(self) -> None:
+        if self.get_resource_kind() == ResourceKind.TASK:
+            self.post_message(self.TaskKindCycled())
+
+    def action_toggle_select(self) -> None:
+        if not self.row_count:
+            return
+
+        resource_id = self._get_highlighted_resource_id()
+        self._set_selected(resource_id, resource_id not in self.selected_keys)
+        self.move_cursor(row=self.cursor_row + 1)
+
+    def action_toggle_select_all(self) -> None:
+        row_keys = [row_key.value for row_key in self.rows]
+        # deselect everything if all rows are selected already
+        selected = len(self.selected_keys) < len(row_keys)
+
+        for resource_id in row_keys:
+            self._set_selected(resource_id, selected)
+
+    def action_batch_edit(self) -> None:
+        if self.get_resource_kind() == ResourceKind.TASK and self.selected_keys:
+            self.post_message(self.OpenBatchEditModal(list(self.selected_keys)))
+
     def action_create_task(self) -> None:
         self.post_message(self.OpenCreateModal(ResourceKind.TASK))
 
     def action_delete_resource(self):
-        cell_key = self.coordinate_to_cell_key(Coordinate(column=self.cursor_column, row=self.cursor_row))
-        resource_id = cell_key.row_key.value
+        if not self.row_count:
+            return
+
         resource_kind = self.get_resource_kind()
-        resource_name = self.get_row(resource_id)[0]
-        self.post_message(self.OpenDeleteModal(resource_id, resource_name, resource_kind))
+
+        if self.selected_keys:
+            resource_ids = list(self.selected_keys)
+        else:
+            resource_ids = [self._get_highlighted_resource_id()]
+
+        if len(resource_ids) == 1:
+            resource_name = str(self.get_row(resource_ids[0])[0])
+        else:
+            resource_name = f'{len(resource_ids)} {str.lower(str(resource_kind))}s'
+
+        self.post_message(self.OpenDeleteModal(resource_ids, resource_name, resource_kind))
 
     def action_edit_resource(self):
-        cell_key = self.coordinate_to_cell_key(Coordinate(column=self.cursor_column, row=self.cursor_row))
-        resource_id = cell_key.row_key.value
+        resource_id = self._get_highlighted_resource_id()
         resource_kind = self.get_resource_kind()
         self.post_message(self.OpenEditModal(resource_id, resource_kind))
 
@@ -142,6 +431,13 @@ class Header(HorizontalGroup, AppStateMixin):
         'number_workspaces': 'Workspaces: ',
     }
 
+    def __init__(self, *args, **kwargs):
+        self.scheduler = DueScheduler()
+        self._scheduler_timer = None
+        self._number_due_today = 0
+
+        super().__init__(*args, **kwargs)
+
     def compose(self) -> ComposeResult:
         yield HorizontalGroup(
             VerticalGroup(
@@ -164,32 +460,39 @@ class Header(HorizontalGroup, AppStateMixin):
         )
 
     def set_info_content(self):
-        workspaces = self.get_current_workspaces()
-        number_workspaces = len(workspaces)
-        number_current = 0
-        number_backlog = 0
-        number_due_today = 0
-
-        for workspace in workspaces.values():
-            for task in workspace.task_dict.values():
-                if task.kind == TaskKind.CURRENT:
-                    number_current += 1
-                    if task.due_datetime and (task.due_datetime.date() - datetime.now().date()).days < 1:
-                        number_due_today += 1
-                elif task.kind == TaskKind.BACKLOG:
-                    number_backlog += 1
-
-        label_value_dict = {
-            'number_workspaces': number_workspaces,
-            'number_current': number_current,
-            'number_backlog': number_backlog,
-            'number_due_today': number_due_today,
-        }
+        now = datetime.now()
+        label_value_dict = TasksProcessor.get_counts(self.get_current_workspaces(), now)
+
+        # the tasks count as due from the start of their due day on
+        self.scheduler.clear()
+        for task_id, due_datetime in label_value_dict.pop('upcoming_due'):
+            self.scheduler.push(get_start_of_day(due_datetime), task_id)
+
+        self._number_due_today = label_value_dict['number_due_today']
+        self._start_scheduler_timer(now)
 
         for label_id, label_title in self._label_title_dict.items():
             label = self.query_one(f'#{label_id}', Label)
             label.update(self._generate_label_value(label_title, label_value_dict[label_id]))
 
+    def _start_scheduler_timer(self, now: datetime) -> None:
+        if self._scheduler_timer:
+            self._scheduler_timer.stop()
+
+        delay = self.scheduler.get_seconds_until_next_wake(now)
+        self._scheduler_timer = self.set_timer(delay, self._update_due_today) if delay is not None else None
+
+    def _update_due_today(self) -> None:
+        now = datetime.now()
+        newly_due_task_ids = self.scheduler.pop_due_entries(now)
+
+        if newly_due_task_ids:
+            self._number_due_today += len(newly_due_task_ids)
+            label = self.query_one('#number_due_today', Label)
+            label.update(self._generate_label_value(self._label_title_dict['number_due_today'], self._number_due_today))
+
+        self._start_scheduler_timer(now)
+
     @staticmethod
     def _generate_label_value(label_title: str, value: str | int, style='#ffff66') -> Text:
         return Text.assemble((f'{label_title}', style), str(value))
@@ -207,10 +510,14 @@ class TaskModal(ResourceModal):
         self.name_initial = ''
         self.priority_initial = ''
         self.due_datetime_initial = ''
+        self.tags_initial = ''
+        self.recurrence_initial = ''
 
         if task:
             self.name_initial = task.name
             self.priority_initial = task.priority
+            self.tags_initial = ' '.join(task.tags)
+            self.recurrence_initial = str(task.recurrence).lower() if task.recurrence else ''
 
             if isinstance(task.due_datetime, datetime):
                 self.due_datetime_initial = task.get_date_as_str(task.due_datetime)
@@ -241,6 +548,43 @@ class TaskModal(ResourceModal):
             validate_on=[],
             validators=DueDateValidator(),
         )
+        yield Input(
+            placeholder='Tags (separated by spaces - Optional)',
+            restrict=r'^[ \w\-]*$',
+            max_length=200,
+            id='tags',
+            value=self.tags_initial,
+        )
+        yield Input(
+            placeholder='Repeat every day, week or month (Optional)',
+            restrict=r'^[a-zA-Z]{0,5}$',
+            id='recurrence',
+            value=self.recurrence_initial,
+            validate_on=[],
+            validators=RecurrenceValidator(),
+        )
+
+        # spaces needed for correct coloring
+        yield HorizontalGroup(Container(), Button(label='     Save     ', compact=True), Container())
+
+        for widget in super().compose():
+            yield widget
+
+
+class TagFilterModal(ResourceModal):
+    def __init__(self, tag_filter: str):
+        self.tag_filter_initial = tag_filter
+
+        super().__init__()
+
+    def compose(self) -> ComposeResult:
+        yield Input(
+            placeholder='Tags, e.g. "work urgent !waiting" - empty shows all tasks',
+            restrict=r'^[ \w\-!]*$',
+            max_length=200,
+            id='tags',
+            value=self.tag_filter_initial,
+        )
 
         # spaces needed for correct coloring
         yield HorizontalGroup(Container(), Button(label='     Save     ', compact=True), Container())
@@ -249,6 +593,68 @@ class TaskModal(ResourceModal):
             yield widget
 
 
-class WorkspaceModal(ResourceModal):
+class WorkspaceModal(ResourceModal, AppStateMixin):
     def __init__(self, workspace: Workspace = None):
+        self.name_initial = ''
+
+        if workspace:
+            self.name_initial = workspace.name
+
         super().__init__()
+
+    def compose(self) -> ComposeResult:
+        # the own name is allowed when editing, otherwise workspace names need to be unique
+        taken_names = [
+            workspace.name
+            for workspace in self.get_current_workspaces().values()
+            if workspace.name != self.name_initial
+        ]
+
+        yield Input(
+            placeholder='Workspace Name',
+            restrict=r'^[ \w\-\_\/,;.:?]*$',
+            max_length=50,
+            id='name',
+            value=self.name_initial,
+            validate_on=[],
+            validators=UniqueWorkspaceNameValidator(taken_names),
+        )
+
+        # spaces needed for correct coloring
+        yield HorizontalGroup(Container(), Button(label='     Save     ', compact=True), Container())
+
+        for widget in super().compose():
+            yield widget
+
+
+class BatchTaskModal(ResourceModal):
+    def __init__(self, workspace_names: list[str]):
+        self.workspace_names = workspace_names
+
+        super().__init__()
+
+    def compose(self) -> ComposeResult:
+        yield Input(
+            placeholder='Priority (Between 1 and 5 - Optional)',
+            restrict=r'^[12345]{0,1}$',
+            id='priority',
+        )
+        yield Input(
+            placeholder='Kind (current, completed or backlog - Optional)',
+            restrict=r'^[a-zA-Z]{0,9}$',
+            id='kind',
+            validate_on=[],
+            validators=TaskKindValidator(),
+        )
+        yield Input(
+            placeholder='Move to Workspace (Optional)',
+            id='workspace_name',
+            validate_on=[],
+            validators=WorkspaceNameValidator(self.workspace_names),
+        )
+
+        # spaces needed for correct coloring
+        yield HorizontalGroup(Container(), Button(label='     Save     ', compact=True), Container())
+
+        for widget in super().compose():
+            yield widget
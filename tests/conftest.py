@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the modules of the app import each other by their file name
+sys.path.insert(0, str(Path(__file__).parent.parent / 'tasknomi'))
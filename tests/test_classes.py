@@ -0,0 +1,168 @@
+import pytest
+from classes import DependencyGraph, TagIndex, Task, TaskKind, Workspace
+
+WORKSPACE_ID = 'workspace'
+
+
+def _task(task_id, tags=None, kind=TaskKind.CURRENT, depends_on=None):
+    return Task(task_id, WORKSPACE_ID, id=task_id, tags=tags, kind=kind, depends_on=depends_on)
+
+
+def test_tag_index_query():
+    tag_index = TagIndex([_task('a', ['x', 'y']), _task('b', ['x']), _task('c', ['y'], kind=TaskKind.BACKLOG)])
+
+    assert tag_index.query(['x'], []) == ['a', 'b']
+    assert tag_index.query(['x'], ['y']) == ['b']
+    assert tag_index.query(['y'], [], TaskKind.BACKLOG) == ['c']
+    assert tag_index.query(['z'], []) == []
+
+
+def test_tag_index_reuses_the_position_of_a_removed_task():
+    tag_index = TagIndex([_task('a', ['x']), _task('b', ['x', 'y']), _task('c', ['x'])])
+
+    tag_index.remove('b')
+    tag_index.add(_task('d', ['z']))
+
+    # d got the position of b, none of the tags of b are left on it
+    assert tag_index._positions['d'] == 1
+    assert len(tag_index._task_ids) == 3
+    assert tag_index.query(['x'], []) == ['a', 'c']
+    assert tag_index.query(['y'], []) == []
+    assert tag_index.query(['z'], []) == ['d']
+    assert tag_index.query([], []) == ['a', 'd', 'c']
+
+
+def test_tag_index_replaces_an_edited_task():
+    task = _task('a', ['x'])
+    tag_index = TagIndex([task, _task('b', ['x'])])
+
+    # edits change the task in place, the old tags are still cleared
+    task.tags = ['y']
+    task.kind = TaskKind.COMPLETED
+    tag_index.add(task)
+
+    assert tag_index.query(['x'], []) == ['b']
+    assert tag_index.query(['y'], [], TaskKind.COMPLETED) == ['a']
+    assert tag_index.query([], [], TaskKind.CURRENT) == ['b']
+
+
+def test_tag_index_ignores_unknown_tasks():
+    tag_index = TagIndex([_task('a', ['x'])])
+
+    tag_index.remove('unknown')
+
+    assert tag_index.query(['x'], []) == ['a']
+
+
+@pytest.mark.parametrize('dependency_first', [True, False])
+def test_dependency_graph_counts_open_dependencies_in_any_order(dependency_first):
+    dependency = _task('dependency')
+    dependent = _task('dependent', depends_on=['dependency', 'missing'])
+    graph = DependencyGraph()
+
+    for task in [dependency, dependent] if dependency_first else [dependent, dependency]:
+        graph.add(task)
+
+    # tasks that are not in the workspace don't block
+    assert dependent.number_open_dependencies == 1
+    assert dependency.number_open_dependencies == 0
+
+
+def test_dependency_graph_completion_unblocks_dependents():
+    dependency = _task('dependency')
+    dependents = [_task(f'dependent{i}', depends_on=['dependency']) for i in range(2)]
+    graph = DependencyGraph([dependency, *dependents])
+
+    dependency.kind = TaskKind.COMPLETED
+    graph.add(dependency)
+
+    assert [task.number_open_dependencies for task in dependents] == [0, 0]
+
+    dependency.kind = TaskKind.CURRENT
+    graph.add(dependency)
+
+    assert [task.number_open_dependencies for task in dependents] == [1, 1]
+
+
+def test_dependency_graph_completed_dependency_added_later_does_not_block():
+    dependent = _task('dependent', depends_on=['dependency'])
+    graph = DependencyGraph([dependent])
+
+    graph.add(_task('dependency', kind=TaskKind.COMPLETED))
+
+    assert dependent.number_open_dependencies == 0
+
+
+def test_dependency_graph_deletion_unblocks_dependents():
+    dependent = _task('dependent', depends_on=['a', 'b'])
+    graph = DependencyGraph([_task('a'), _task('b'), dependent])
+
+    graph.remove('a')
+
+    assert dependent.number_open_dependencies == 1
+
+    # removing the dependent removes its edges, the other dependency does not change it anymore
+    graph.remove('dependent')
+    graph.remove('b')
+
+    assert dependent.number_open_dependencies == 1
+
+
+def test_dependency_graph_edit_of_the_dependencies():
+    dependent = _task('dependent', depends_on=['a'])
+    graph = DependencyGraph([_task('a'), _task('b', kind=TaskKind.COMPLETED), _task('c'), dependent])
+
+    dependent.depends_on = ['b', 'c']
+    graph.add(dependent)
+
+    assert dependent.number_open_dependencies == 1
+
+    # a is not a dependency anymore
+    graph.remove('a')
+    graph.remove('c')
+
+    assert dependent.number_open_dependencies == 0
+
+
+def test_moving_a_task_to_another_workspace_unblocks_its_dependents():
+    dependency = _task('dependency')
+    dependent = _task('dependent', depends_on=['dependency'])
+    workspace = Workspace('source', {task.id: task for task in [dependency, dependent]}, id=WORKSPACE_ID)
+    other_workspace = Workspace('target', id='other')
+
+    assert dependent.number_open_dependencies == 1
+
+    # like a batch edit, dependencies only exist within a workspace
+    workspace.remove_task(dependent.id)
+    dependent.workspace_id = other_workspace.id
+    dependent.depends_on = []
+    other_workspace.add_task(dependent)
+
+    assert dependent.number_open_dependencies == 0
+
+    dependent_of_moved = _task('dependent_of_moved', depends_on=['dependency'])
+    workspace.add_task(dependent_of_moved)
+    workspace.remove_task(dependency.id)
+    dependency.workspace_id = other_workspace.id
+    other_workspace.add_task(dependency)
+
+    assert dependent_of_moved.number_open_dependencies == 0
+
+
+@pytest.mark.parametrize(
+    'task_id, dependency_ids, expected',
+    [
+        ('a', ['a'], True),
+        ('a', ['c'], True),
+        ('b', ['d', 'c'], True),
+        ('c', ['a'], False),
+        ('a', ['d'], False),
+        ('d', ['a', 'c'], False),
+        ('a', ['missing'], False),
+    ],
+)
+def test_dependency_graph_cycles(task_id, dependency_ids, expected):
+    # c -> b -> a
+    graph = DependencyGraph([_task('a'), _task('b', depends_on=['a']), _task('c', depends_on=['b']), _task('d')])
+
+    assert graph.would_create_cycle(task_id, dependency_ids) == expected
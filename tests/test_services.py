@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+import pytest
+import services
+from services import (
+    encode_id_time,
+    generate_id,
+    get_id_time_prefix,
+    get_next_humanize_change,
+    humanize_date,
+    is_time_sortable_id,
+)
+
+NOW = datetime(2026, 10, 19, 15, 30)
+
+
+@pytest.mark.parametrize('days', range(-400, 400))
+def test_next_humanize_change_is_the_first_day_with_another_label(days):
+    date_time = NOW + timedelta(days=days)
+    label = humanize_date(date_time, NOW)
+
+    next_change = get_next_humanize_change(date_time, NOW)
+
+    assert next_change.time() == datetime.min.time()
+    assert humanize_date(date_time, next_change) != label
+    # the label stays the same on all days before
+    for day in range((next_change - NOW).days + 1):
+        assert humanize_date(date_time, NOW + timedelta(days=day)) == label
+
+
+def test_next_humanize_change_without_date():
+    assert get_next_humanize_change('', NOW) is None
+
+
+@pytest.fixture
+def last_id_parts(monkeypatch):
+    # ids continue the last generated one, the tests start without one and leave it as it was
+    monkeypatch.setattr(services, '_last_id_parts', (0, 0))
+
+
+@pytest.mark.usefixtures('last_id_parts')
+def test_ids_of_the_same_ms_are_in_order():
+    ids = [generate_id(NOW) for _ in range(1000)]
+
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert {get_id_time_prefix(resource_id) for resource_id in ids} == {encode_id_time(NOW)}
+
+
+@pytest.mark.usefixtures('last_id_parts')
+def test_ids_stay_in_order_if_the_clock_is_set_back():
+    first_id = generate_id(NOW + timedelta(days=1))
+    second_id = generate_id(NOW)
+
+    assert first_id < second_id
+    assert get_id_time_prefix(second_id) == get_id_time_prefix(first_id)
+
+
+@pytest.mark.usefixtures('last_id_parts')
+def test_ids_are_ordered_by_time():
+    first_id = generate_id(NOW + timedelta(days=2))
+    second_id = generate_id(NOW + timedelta(days=2, milliseconds=1))
+
+    assert first_id < second_id
+    assert is_time_sortable_id(first_id)
+    assert encode_id_time(NOW + timedelta(days=2)) == get_id_time_prefix(first_id)
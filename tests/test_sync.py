@@ -0,0 +1,313 @@
+import json
+import os
+
+import pytest
+from file_io import FileIO
+from rollups import Rollups
+from services import generate_id
+from sync import DataDirectory, sync
+
+WORKSPACE_ID = 'workspace'
+DATA_DIRECTORY_NAMES = ('source', 'target')
+
+
+@pytest.fixture
+def directories(tmp_path):
+    # two data directories that were synced once
+    source_path = tmp_path / 'source'
+    target_path = tmp_path / 'target'
+    source_path.mkdir()
+    target_path.mkdir()
+
+    _write(source_path / 'workspaces.json', [{'name': 'default', 'id': WORKSPACE_ID}])
+    _write(source_path / WORKSPACE_ID / 'a.json', {'name': 'a'})
+    _write(source_path / WORKSPACE_ID / 'b.json', {'name': 'b'})
+    sync(source_path, target_path)
+
+    return source_path, target_path
+
+
+def _write(file_path, content, mtime=None):
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_text(json.dumps(content))
+
+    if mtime is not None:
+        os.utime(file_path, ns=(mtime, mtime))
+    _mark_changed(file_path)
+
+
+def _write_segment(file_path, segment, mtime=None):
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    FileIO._write_archive_segment(file_path, segment)
+
+    if mtime is not None:
+        os.utime(file_path, ns=(mtime, mtime))
+    _mark_changed(file_path)
+
+
+def _delete(file_path):
+    if file_path.is_dir():
+        for nested_file_path in file_path.iterdir():
+            nested_file_path.unlink()
+        file_path.rmdir()
+    else:
+        file_path.unlink()
+
+    _mark_changed(file_path)
+
+
+def _mark_changed(file_path):
+    # like FileIO does for the data directory of the app
+    data_path = next(path for path in file_path.parents if path.name in DATA_DIRECTORY_NAMES)
+    FileIO.mark_changed([file_path.relative_to(data_path).as_posix()], data_path)
+
+
+def _read(file_path):
+    return json.loads(file_path.read_text())
+
+
+def test_first_sync_copies_everything(directories):
+    _, target_path = directories
+
+    assert _read(target_path / WORKSPACE_ID / 'a.json') == {'name': 'a'}
+    assert _read(target_path / 'workspaces.json') == [{'name': 'default', 'id': WORKSPACE_ID}]
+
+
+def test_sync_without_changes_does_nothing(directories):
+    result = sync(*directories)
+
+    assert not (result.copied_to_source or result.copied_to_target or result.deleted or result.merged)
+
+
+def test_deletion_is_propagated(directories):
+    source_path, target_path = directories
+    _delete(source_path / WORKSPACE_ID / 'a.json')
+
+    result = sync(source_path, target_path)
+
+    assert result.deleted == [f'{WORKSPACE_ID}/a.json']
+    assert not (target_path / WORKSPACE_ID / 'a.json').exists()
+    assert (target_path / WORKSPACE_ID / 'b.json').exists()
+    # the deletion is part of the base of the next sync, the file does not come back
+    assert not sync(source_path, target_path).copied_to_source
+
+
+def test_deletion_of_a_workspace_removes_its_directory(directories):
+    source_path, target_path = directories
+    _delete(source_path / WORKSPACE_ID)
+
+    sync(source_path, target_path)
+
+    assert not (target_path / WORKSPACE_ID).exists()
+
+
+def test_edit_on_one_side_is_copied(directories):
+    source_path, target_path = directories
+    _write(target_path / WORKSPACE_ID / 'a.json', {'name': 'edited'})
+
+    result = sync(source_path, target_path)
+
+    assert result.copied_to_source == [f'{WORKSPACE_ID}/a.json']
+    assert _read(source_path / WORKSPACE_ID / 'a.json') == {'name': 'edited'}
+
+
+def test_edit_wins_over_deletion(directories):
+    source_path, target_path = directories
+    _delete(source_path / WORKSPACE_ID / 'a.json')
+    _write(target_path / WORKSPACE_ID / 'a.json', {'name': 'edited'})
+
+    result = sync(source_path, target_path)
+
+    assert result.copied_to_source == [f'{WORKSPACE_ID}/a.json']
+    assert _read(source_path / WORKSPACE_ID / 'a.json') == {'name': 'edited'}
+
+
+def test_new_files_are_copied_both_ways(directories):
+    source_path, target_path = directories
+    _write(source_path / WORKSPACE_ID / 'c.json', {'name': 'c'})
+    _write(target_path / WORKSPACE_ID / 'd.json', {'name': 'd'})
+
+    result = sync(source_path, target_path)
+
+    assert result.copied_to_target == [f'{WORKSPACE_ID}/c.json']
+    assert result.copied_to_source == [f'{WORKSPACE_ID}/d.json']
+
+
+def test_conflicting_task_keeps_the_newer_version(directories):
+    source_path, target_path = directories
+    _write(source_path / WORKSPACE_ID / 'a.json', {'name': 'older'}, mtime=1_000_000_000_000_000_000)
+    _write(target_path / WORKSPACE_ID / 'a.json', {'name': 'newer'}, mtime=2_000_000_000_000_000_000)
+
+    result = sync(source_path, target_path)
+
+    assert result.merged == [f'{WORKSPACE_ID}/a.json']
+    for data_path in directories:
+        assert _read(data_path / WORKSPACE_ID / 'a.json') == {'name': 'newer'}
+
+
+def test_conflicting_workspaces_keep_workspaces_of_both_sides(directories):
+    source_path, target_path = directories
+    _write(
+        source_path / 'workspaces.json',
+        [{'name': 'default', 'id': WORKSPACE_ID}, {'name': 'source', 'id': 'source'}],
+        mtime=1_000_000_000_000_000_000,
+    )
+    _write(
+        target_path / 'workspaces.json',
+        [{'name': 'renamed', 'id': WORKSPACE_ID}, {'name': 'target', 'id': 'target'}],
+        mtime=2_000_000_000_000_000_000,
+    )
+
+    result = sync(source_path, target_path)
+
+    assert result.merged == ['workspaces.json']
+    for data_path in directories:
+        assert _read(data_path / 'workspaces.json') == [
+            {'name': 'renamed', 'id': WORKSPACE_ID},
+            {'name': 'target', 'id': 'target'},
+            {'name': 'source', 'id': 'source'},
+        ]
+
+
+def test_workspace_deleted_on_one_side_and_created_on_the_other(directories):
+    source_path, target_path = directories
+    _write(source_path / 'workspaces.json', [{'name': 'default', 'id': WORKSPACE_ID}, {'name': 'x', 'id': 'x'}])
+    _write(source_path / 'x' / 'c.json', {'name': 'c'})
+    sync(source_path, target_path)
+
+    # the deletion on the newer side and the creation on the older side are both kept
+    _write(source_path / 'workspaces.json', [{'name': 'default', 'id': WORKSPACE_ID}], mtime=2_000_000_000_000_000_000)
+    _delete(source_path / 'x')
+    _write(
+        target_path / 'workspaces.json',
+        [{'name': 'default', 'id': WORKSPACE_ID}, {'name': 'x', 'id': 'x'}, {'name': 'y', 'id': 'y'}],
+        mtime=1_000_000_000_000_000_000,
+    )
+    _write(target_path / 'y' / 'd.json', {'name': 'd'})
+
+    result = sync(source_path, target_path)
+
+    assert result.merged == ['workspaces.json']
+    for data_path in directories:
+        assert _read(data_path / 'workspaces.json') == [
+            {'name': 'default', 'id': WORKSPACE_ID},
+            {'name': 'y', 'id': 'y'},
+        ]
+        assert not (data_path / 'x').exists()
+        assert (data_path / 'y' / 'd.json').exists()
+
+
+def test_workspace_renamed_on_one_side_is_kept_if_deleted_on_the_other(directories):
+    source_path, target_path = directories
+    _write(source_path / 'workspaces.json', [{'name': 'default', 'id': WORKSPACE_ID}, {'name': 'x', 'id': 'x'}])
+    sync(source_path, target_path)
+
+    _write(source_path / 'workspaces.json', [{'name': 'default', 'id': WORKSPACE_ID}], mtime=2_000_000_000_000_000_000)
+    _write(
+        target_path / 'workspaces.json',
+        [{'name': 'default', 'id': WORKSPACE_ID}, {'name': 'renamed', 'id': 'x'}],
+        mtime=1_000_000_000_000_000_000,
+    )
+
+    sync(source_path, target_path)
+
+    for data_path in directories:
+        assert _read(data_path / 'workspaces.json') == [
+            {'name': 'default', 'id': WORKSPACE_ID},
+            {'name': 'renamed', 'id': 'x'},
+        ]
+
+
+def test_tasks_removed_from_a_segment_stay_removed(directories):
+    source_path, target_path = directories
+    segment_path = f'{WORKSPACE_ID}/{FileIO.ARCHIVE_DIR_NAME}/2026-01{FileIO.ARCHIVE_SEGMENT_SUFFIX}'
+    _write_segment(source_path / segment_path, {'c': {'name': 'c'}, 'd': {'name': 'd'}})
+    sync(source_path, target_path)
+
+    # c was moved back into its own file on one side, e was archived on the other side
+    _write_segment(source_path / segment_path, {'d': {'name': 'd'}}, mtime=2_000_000_000_000_000_000)
+    _write(source_path / WORKSPACE_ID / 'c.json', {'name': 'c'})
+    _write_segment(
+        target_path / segment_path,
+        {'c': {'name': 'c'}, 'd': {'name': 'd'}, 'e': {'name': 'e'}},
+        mtime=1_000_000_000_000_000_000,
+    )
+
+    result = sync(source_path, target_path)
+
+    assert result.merged == [segment_path]
+    for data_path in directories:
+        assert FileIO._read_archive_segment(data_path / segment_path) == {'d': {'name': 'd'}, 'e': {'name': 'e'}}
+        assert _read(data_path / WORKSPACE_ID / 'c.json') == {'name': 'c'}
+
+
+def test_cache_matches_the_directories_after_sync(directories):
+    source_path, target_path = directories
+    _write(source_path / WORKSPACE_ID / 'c.json', {'name': 'c'})
+    _delete(target_path / WORKSPACE_ID / 'b.json')
+    _write(target_path / 'other' / 'd.json', {'name': 'd'})
+
+    sync(source_path, target_path)
+
+    for data_path in directories:
+        data_directory = DataDirectory(data_path)
+        cached_file_dict = dict(data_directory.file_dict)
+        cached_node_dict = json.loads(json.dumps(data_directory.node_dict))
+        data_directory.build_tree()
+        assert cached_file_dict == data_directory.file_dict
+        assert cached_node_dict == data_directory.node_dict
+        assert data_directory.synced_dict == {
+            relative_path: entry[2] for relative_path, entry in data_directory.file_dict.items()
+        }
+        assert not (data_path / FileIO.CHANGES_FILE_NAME).exists()
+
+
+def test_only_changed_files_are_hashed(directories, monkeypatch):
+    source_path, target_path = directories
+    for i in range(50):
+        _write(source_path / WORKSPACE_ID / f'{i}.json', {'name': str(i)})
+    sync(source_path, target_path)
+    _write(source_path / WORKSPACE_ID / 'c.json', {'name': 'c'})
+
+    hashed_paths = []
+    get_file_entry = DataDirectory._get_file_entry
+    monkeypatch.setattr(
+        DataDirectory,
+        '_get_file_entry',
+        staticmethod(lambda file_path, cached: hashed_paths.append(file_path) or get_file_entry(file_path, cached)),
+    )
+    result = sync(source_path, target_path)
+
+    assert result.copied_to_target == [f'{WORKSPACE_ID}/c.json']
+    # once for the change and once on each side after copying it
+    assert hashed_paths == [
+        source_path / WORKSPACE_ID / 'c.json',
+        source_path / WORKSPACE_ID / 'c.json',
+        target_path / WORKSPACE_ID / 'c.json',
+    ]
+
+
+def test_changes_without_the_app_are_found_by_a_rescan(directories):
+    source_path, target_path = directories
+    (source_path / WORKSPACE_ID / 'c.json').write_text(json.dumps({'name': 'c'}))
+
+    assert not sync(source_path, target_path).copied_to_target
+    assert sync(source_path, target_path, rescan=True).copied_to_target == [f'{WORKSPACE_ID}/c.json']
+
+
+def test_only_the_rollups_of_changed_workspaces_get_stale(directories):
+    source_path, target_path = directories
+    for data_path in directories:
+        Rollups._write_content({'version': Rollups.VERSION, 'workspaces': dict(), 'stale': ['other']}, data_path)
+    _write(source_path / WORKSPACE_ID / 'c.json', {'name': 'c'})
+
+    sync(source_path, target_path)
+
+    for data_path in directories:
+        assert Rollups._read_content(data_path)['stale'] == ['other', WORKSPACE_ID]
+
+
+def test_task_ids_are_spread_over_buckets():
+    buckets = {DataDirectory._get_tree_path(f'{WORKSPACE_ID}/{generate_id()}.json')[1] for _ in range(1000)}
+
+    assert len(buckets) > 100